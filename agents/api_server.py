@@ -1,14 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, AsyncGenerator
 from agents.swarm import AgentSwarm
+from agents.deadline import DeadlineExceeded
+from agents.logs import log_stats
+from agents.usage import TokenBudgetExceeded
 from config.settings import (
     SSL_ENABLED, 
     SEND_FULL_SWARM_RESPONSE, 
-    USE_STREAMING
+    USE_STREAMING,
+    DISCONNECT_POLL_INTERVAL,
+    FRONTEND_WEIGHTS
 )
+from contextlib import suppress
+import asyncio
 import json
 import uvicorn
 
@@ -23,9 +30,11 @@ class Query(BaseModel):
     text: str
     user_id: Optional[str] = "default"
     parameters: Optional[AgentParameters] = None
+    latency_budget: Optional[float] = None  # seconds
+    priority: Optional[str] = None  # scheduling class, e.g. "batch" to yield to interactive traffic
 
 class APIServer:
-    def __init__(self, host: str = "0.0.0.0", port: int = 8000):
+    def __init__(self, host: str = "0.0.0.0", port: int = 8000, swarm: Optional[AgentSwarm] = None):
         self.app = FastAPI(
             title="AI Agent Swarm API",
             description="API interface for the AI Agent Swarm",
@@ -33,7 +42,9 @@ class APIServer:
         )
         self.host = host
         self.port = port
-        self.swarm = AgentSwarm()
+        # Frontends running on the same loop pass in one swarm so they share its scheduler
+        self.swarm = swarm or AgentSwarm()
+        self.abandoned_runs = 0
         
         self.app.add_middleware(
             CORSMiddleware,
@@ -47,39 +58,89 @@ class APIServer:
         
         self.setup_routes()
 
-    async def stream_to_sse(self, generator: AsyncGenerator) -> AsyncGenerator[str, None]:
-        """Convert generator output to SSE format"""
+    async def stream_to_sse(self, generator: AsyncGenerator, request: Optional[Request] = None) -> AsyncGenerator[str, None]:
+        """Convert generator output to SSE format, cancelling it if the client disconnects"""
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(request)) if request else None
+        pending = None
+        finished = False
         try:
-            async for chunk in generator:
+            while True:
+                pending = asyncio.ensure_future(generator.__anext__())
+                if disconnected is not None:
+                    await asyncio.wait({pending, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                    if not pending.done():
+                        # Client went away while we were waiting on the provider
+                        break
+                try:
+                    chunk = await pending
+                except StopAsyncIteration:
+                    finished = True
+                    break
+                pending = None
                 if chunk:
                     # Format as SSE data
                     yield f"data: {json.dumps(chunk)}\n\n"
         except Exception as e:
+            finished = True
             error_msg = f"data: {json.dumps({'error': str(e)})}\n\n"
             yield error_msg
+        finally:
+            if disconnected is not None:
+                disconnected.cancel()
+            if not finished:
+                self.abandoned_runs += 1
+            # Shielded so cleanup completes even when the server cancels this response
+            await asyncio.shield(self._close_stream(generator, pending))
+
+    @staticmethod
+    def _frontend(query: Query) -> str:
+        """Scheduling class of a request, clients can lower their priority but not raise it"""
+        api_weight = FRONTEND_WEIGHTS.get("api", FRONTEND_WEIGHTS.get("default", 1))
+        if query.priority in FRONTEND_WEIGHTS and FRONTEND_WEIGHTS[query.priority] <= api_weight:
+            return query.priority
+        return "api"
+
+    @staticmethod
+    async def _wait_for_disconnect(request: Request):
+        """Return once the client has closed the connection"""
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+    @staticmethod
+    async def _close_stream(generator: AsyncGenerator, pending: Optional[asyncio.Future]):
+        """Cancel an in-flight step and close the swarm generator with its provider streams"""
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration, Exception):
+                await pending
+        await generator.aclose()
     
     def setup_routes(self):
+        @self.app.on_event("startup")
+        async def warm_up():
+            """Warm up provider connections before serving requests"""
+            await self.swarm.warm_up()
+
         @self.app.get("/agent-parameters")
         async def get_agent_parameters():
             """Get available agent parameters and their defaults"""
-            from agents.roles import AGENT_ROLES
-            parameters = {}
-            for role, config in AGENT_ROLES.items():
-                if "parameters" in config:
-                    parameters[role] = config["parameters"]
-            return parameters
+            return self.swarm.roles.parameters()
 
         @self.app.post("/query")
-        async def process_query(query: Query):
+        async def process_query(query: Query, request: Request):
             try:
+                # Reject before streaming starts so clients get a proper status code
+                self.swarm.usage.check_budget(query.user_id)
                 if USE_STREAMING:
                     generator = self.swarm.process_query_streaming(
                         query.text,
                         user_id=query.user_id,
-                        parameters=query.parameters.dict() if query.parameters else None
+                        parameters=query.parameters.dict() if query.parameters else None,
+                        latency_budget=query.latency_budget,
+                        frontend=self._frontend(query)
                     )
                     return StreamingResponse(
-                        self.stream_to_sse(generator),
+                        self.stream_to_sse(generator, request),
                         media_type='text/event-stream'
                     )
                 else:
@@ -87,24 +148,57 @@ class APIServer:
                         responses = await self.swarm.process_query_with_details(
                             query.text,
                             user_id=query.user_id,
-                            parameters=query.parameters.dict() if query.parameters else None
+                            parameters=query.parameters.dict() if query.parameters else None,
+                            latency_budget=query.latency_budget,
+                            frontend=self._frontend(query)
                         )
                         return responses
                     else:
                         response = await self.swarm.process_query(
                             query.text,
                             user_id=query.user_id,
-                            parameters=query.parameters.dict() if query.parameters else None
+                            parameters=query.parameters.dict() if query.parameters else None,
+                            latency_budget=query.latency_budget,
+                            frontend=self._frontend(query)
                         )
                         return {"response": response}
+            except TokenBudgetExceeded as e:
+                raise HTTPException(status_code=429, detail=str(e))
+            except DeadlineExceeded as e:
+                raise HTTPException(status_code=504, detail=str(e))
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
 
+        @self.app.get("/usage")
+        async def get_usage(user_id: Optional[str] = None):
+            """Get token usage per role and per user, or for a single user"""
+            return self.swarm.usage.summary(user_id)
+
         @self.app.get("/health")
         async def health_check():
-            return {"status": "healthy"}
+            return {
+                "status": "healthy",
+                "connections": self.swarm.connections.stats(),
+                "abandoned_runs": self.abandoned_runs,
+                "scheduler": self.swarm.scheduler.stats(),
+                "stage_cache": self.swarm.stage_cache.stats(),
+                "logs": log_stats()
+            }
     
     def run(self):
         """Start the API server"""
         print(f"🚀 Starting AI Agent Swarm API server on port {self.port}...")
-        uvicorn.run(self.app, host=self.host, port=self.port) 
\ No newline at end of file
+        uvicorn.run(self.app, host=self.host, port=self.port)
+
+    async def serve(self):
+        """Serve the API on the running event loop, next to other frontends"""
+        print(f"🚀 Starting AI Agent Swarm API server on port {self.port}...")
+        server = uvicorn.Server(uvicorn.Config(self.app, host=self.host, port=self.port))
+        serving = asyncio.ensure_future(server.serve())
+        try:
+            await asyncio.shield(serving)
+        except asyncio.CancelledError:
+            # Let uvicorn finish its shutdown instead of cancelling it midway
+            server.should_exit = True
+            await serving
+            raise 
\ No newline at end of file
@@ -0,0 +1,134 @@
+from typing import Dict, List, Set
+import asyncio
+import json
+import os
+import time
+from agents.swarm import AgentSwarm
+
+class BatchRunner:
+    def __init__(self, swarm: AgentSwarm, concurrency: int = 8, progress_interval: float = 5):
+        self.swarm = swarm
+        self.concurrency = max(1, concurrency)
+        self.progress_interval = progress_interval
+        self.completed = 0
+        self.failed = 0
+
+    @staticmethod
+    def load_checkpoint(checkpoint_path: str) -> Set[str]:
+        """Get the ids completed by previous runs"""
+        if not os.path.exists(checkpoint_path):
+            return set()
+        with open(checkpoint_path, encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    @staticmethod
+    def load_queries(input_path: str, done: Set[str]) -> List[Dict]:
+        """Read queries that still need to run, ids default to the line number"""
+        queries = []
+        with open(input_path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"⚠️ Skipping invalid JSON on line {line_number}: {e}")
+                    continue
+                text = item.get("text") or item.get("query")
+                if not text:
+                    print(f"⚠️ Skipping line {line_number}: no 'text' or 'query' field")
+                    continue
+                item_id = str(item.get("id", line_number))
+                if item_id in done:
+                    continue
+                queries.append({
+                    "id": item_id,
+                    "text": text,
+                    # Each item is its own conversation unless it names a user, so answers don't leak between items
+                    "user_id": str(item.get("user_id", item_id)),
+                    "parameters": item.get("parameters"),
+                    "latency_budget": item.get("latency_budget")
+                })
+        return queries
+
+    async def run(self, input_path: str, output_path: str, checkpoint_path: str):
+        """Run all pending queries and stream results to the output file"""
+        done = self.load_checkpoint(checkpoint_path)
+        queries = self.load_queries(input_path, done)
+        total = len(queries)
+        print(f"📦 {total} queries to run ({len(done)} already completed), concurrency {self.concurrency}")
+        if not total:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in queries:
+            queue.put_nowait(item)
+
+        started = time.monotonic()
+        # Failures go to their own file so the output holds exactly one result per id
+        with open(output_path, "a", encoding="utf-8") as output, \
+                open(f"{output_path}.errors", "a", encoding="utf-8") as errors, \
+                open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            workers = [
+                asyncio.create_task(self._worker(queue, output, errors, checkpoint))
+                for _ in range(min(self.concurrency, total))
+            ]
+            reporter = asyncio.create_task(self._report_progress(total, started))
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                reporter.cancel()
+                for worker in workers:
+                    worker.cancel()
+
+        self._print_progress(total, started)
+        print(f"✅ Batch finished: {self.completed} completed, {self.failed} failed")
+
+    async def _worker(self, queue: asyncio.Queue, output, errors, checkpoint):
+        """Process queries until the queue is empty"""
+        while not queue.empty():
+            item = queue.get_nowait()
+            try:
+                details = await self.swarm.process_query_with_details(
+                    item["text"],
+                    user_id=item["user_id"],
+                    parameters=item["parameters"],
+                    latency_budget=item["latency_budget"],
+                    frontend="batch"
+                )
+                result = {
+                    "id": item["id"],
+                    "query": item["text"],
+                    "response": details["synthesizer"]["response"],
+                    "is_simple_query": details["is_simple_query"],
+                    "complexity_tier": details.get("complexity_tier"),
+                    "usage": details.get("usage"),
+                    "degraded": details.get("degraded", False)
+                }
+            except Exception as e:
+                # Failed ids aren't checkpointed so a resumed run retries them
+                self.failed += 1
+                errors.write(json.dumps({"id": item["id"], "query": item["text"], "error": str(e)}) + "\n")
+                errors.flush()
+                continue
+
+            # Write the result before checkpointing so a crash never loses an answer
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            checkpoint.write(item["id"] + "\n")
+            checkpoint.flush()
+            self.completed += 1
+
+    async def _report_progress(self, total: int, started: float):
+        """Periodically print throughput and ETA"""
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self._print_progress(total, started)
+
+    def _print_progress(self, total: int, started: float):
+        finished = self.completed + self.failed
+        elapsed = time.monotonic() - started
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        eta = (total - finished) / rate if rate > 0 else float("inf")
+        eta_text = f"{eta:.0f}s" if eta != float("inf") else "unknown"
+        print(f"⏳ {finished}/{total} done ({self.failed} failed), {rate:.2f} queries/s, ETA {eta_text}")
@@ -0,0 +1,92 @@
+from typing import Dict
+import asyncio
+import time
+import httpx
+
+class ConnectionPool:
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 60, http2: bool = False, timeout: float = 60):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self.http2 = http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️ HTTP/2 needs the h2 package (pip install httpx[http2]), falling back to HTTP/1.1")
+                self.http2 = False
+
+        # Connection reuse metrics
+        self.requests = 0
+        self.new_connections = 0
+        self.last_request = 0.0
+        self._keep_warm_task = None
+
+    def create_client(self) -> httpx.AsyncClient:
+        """Create the HTTP client shared by all calls of a provider client"""
+        return httpx.AsyncClient(
+            limits=self.limits,
+            timeout=self.timeout,
+            http2=self.http2,
+            event_hooks={"request": [self._on_request]}
+        )
+
+    async def _on_request(self, request: httpx.Request):
+        """Count requests and attach a trace hook that sees new connections"""
+        self.requests += 1
+        self.last_request = time.monotonic()
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: Dict):
+        # httpcore's async transport awaits the trace callback
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+
+    def stats(self) -> Dict:
+        """Get connection reuse metrics"""
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reuse_rate": round(reused / self.requests, 3) if self.requests else 0.0,
+            "http2": self.http2
+        }
+
+    async def warm_up(self, client, connections: int = 1, timeout: float = 5):
+        """Pre-establish connections to the provider with cheap requests"""
+        # One short attempt, so an unreachable provider can't hold up startup
+        if hasattr(client, "with_options"):
+            client = client.with_options(max_retries=0, timeout=timeout)
+        # Any response, even an error, leaves a warm connection in the pool
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(
+                    *(client.models.list() for _ in range(connections)),
+                    return_exceptions=True
+                ),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"⚠️ Connection warm-up timed out after {timeout}s")
+            return
+        failed = sum(isinstance(result, Exception) for result in results)
+        if failed == len(results):
+            print(f"⚠️ Connection warm-up failed: {results[0]}")
+
+    def start_keep_warm(self, client, interval: float, connections: int = 1, timeout: float = 5):
+        """Start the keep-warm task if it's not already running"""
+        if self._keep_warm_task is None and interval > 0:
+            loop = asyncio.get_event_loop()
+            self._keep_warm_task = loop.create_task(self._periodic_keep_warm(client, interval, connections, timeout))
+
+    async def _periodic_keep_warm(self, client, interval: float, connections: int, timeout: float):
+        """Periodically touch the provider so idle connections don't expire"""
+        while True:
+            await asyncio.sleep(interval)
+            # Skip the ping when real traffic kept the pool warm
+            if time.monotonic() - self.last_request >= interval:
+                await self.warm_up(client, connections, timeout)
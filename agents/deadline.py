@@ -0,0 +1,67 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import time
+
+class DeadlineExceeded(Exception):
+    """Raised when a run has no answer at all by its deadline"""
+
+class Deadline:
+    def __init__(self, budget: Optional[float] = None, optional_stages: Iterable[str] = (), min_scale: float = 0.25):
+        # No budget means the run is unbounded and every stage runs in full
+        self.expires = time.monotonic() + budget if budget else None
+        self.optional_stages = set(optional_stages)
+        self.min_scale = min_scale
+        self.skipped: List[str] = []
+        self.shortened: List[str] = []
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when there is no deadline"""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def triage_timeout(self, reserve: float) -> Optional[float]:
+        """Seconds triage may take, holding back a quarter to half of the time left for synthesis"""
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return remaining - min(max(reserve, remaining / 4), remaining / 2)
+
+    def plan(self, role_key: str, expected: float, reserve: float = 0.0) -> Optional[Tuple[float, Optional[float]]]:
+        """Decide how to run a stage: (max_tokens scale, timeout), or None to skip it"""
+        # reserve is the time kept back for synthesis after this stage
+        remaining = self.remaining()
+        if remaining is None:
+            return 1.0, None
+
+        # Synthesis runs whenever time is left, shortened to fit and cut off at the deadline
+        if role_key == "synthesizer":
+            if remaining <= 0:
+                self.skipped.append(role_key)
+                return None
+            scale = max(self.min_scale, min(1.0, remaining / expected)) if expected else 1.0
+            if scale < 1.0:
+                self.shortened.append(role_key)
+            return scale, remaining
+
+        available = remaining - reserve
+        if available >= expected:
+            return 1.0, available
+        if role_key in self.optional_stages or available <= 0 or available / expected < self.min_scale:
+            self.skipped.append(role_key)
+            return None
+        self.shortened.append(role_key)
+        return available / expected, available
+
+    def skip(self, role_key: str):
+        """Mark a stage that was dropped after it started, e.g. on timeout"""
+        if role_key in self.shortened:
+            self.shortened.remove(role_key)
+        self.skipped.append(role_key)
+
+    def summary(self) -> Dict:
+        """Report whether the run was degraded to meet the deadline"""
+        return {
+            "degraded": bool(self.skipped or self.shortened),
+            "skipped_stages": self.skipped,
+            "shortened_stages": self.shortened
+        }
@@ -0,0 +1,103 @@
+from typing import Dict, Optional
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+
+LOGGER_NAME = "swarm"
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional["DroppingQueueHandler"] = None
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "query_id": getattr(record, "query_id", "-"),
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False)
+
+class QueryLogger(logging.LoggerAdapter):
+    """Logger bound to one query's correlation id"""
+    def __init__(self, query_id: str, sampled: bool = False, max_body_chars: int = 2000):
+        super().__init__(logging.getLogger(LOGGER_NAME), {"query_id": query_id})
+        self.query_id = query_id
+        self.sampled = sampled
+        self.max_body_chars = max_body_chars
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = dict(kwargs.get("extra") or {}, **self.extra)
+        return msg, kwargs
+
+    def body(self, label: str, text: str):
+        """Log a full query or response body only when sampled or at debug level"""
+        text = text or ""
+        fields = {"fields": {"label": label, "chars": len(text)}}
+        if self.sampled:
+            self.info("%s: %s", label, text[:self.max_body_chars], extra=fields)
+        else:
+            self.info("%s (%d chars)", label, len(text), extra=fields)
+            self.debug("%s: %s", label, text[:self.max_body_chars], extra=fields)
+
+def _default_query_id(record: logging.LogRecord) -> bool:
+    """Give records logged outside a query the placeholder correlation id"""
+    if not hasattr(record, "query_id"):
+        record.query_id = "-"
+    return True
+
+def setup_logging(level: str = "INFO", fmt: str = "text", queue_size: int = 10000):
+    """Route swarm logs through a queue so the event loop never waits on stdout"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(query_id)s] %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(_default_query_id)
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level.upper())
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+    # A background thread does the actual writing
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+def log_stats() -> Dict:
+    """Get log queue load and how many records were dropped because it was full"""
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
+
+def new_query_logger(sample_rate: float = 0.0, max_body_chars: int = 2000) -> QueryLogger:
+    """Create the logger of a new query with a fresh correlation id"""
+    return QueryLogger(uuid.uuid4().hex[:12], random.random() < sample_rate, max_body_chars)
+
+def query_logger(usage: Optional[Dict]) -> QueryLogger:
+    """Get a logger for the query a usage record belongs to"""
+    return QueryLogger(usage.get("query_id", "-") if usage else "-")
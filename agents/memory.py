@@ -21,6 +21,11 @@ class ConversationMemory:
         """Add a query-response pair to the user's conversation history"""
         if user_id not in self._conversations:
             self._conversations[user_id] = deque(maxlen=self.max_history)
+
+        # A re-submitted query replaces its previous answer instead of piling up versions
+        conversation = self._conversations[user_id]
+        if conversation and conversation[-1]['query'] == query:
+            conversation.pop()
             
         self._conversations[user_id].append({
             'timestamp': datetime.now(),
@@ -28,12 +33,14 @@ class ConversationMemory:
             'response': response
         })
     
-    def get_context(self, user_id: str, max_items: int = 3) -> str:
-        """Get recent conversation context for a user"""
+    def get_context(self, user_id: str, max_items: int = 3, exclude_query: Optional[str] = None) -> str:
+        """Get recent conversation context for a user, leaving out exchanges of exclude_query"""
         if user_id not in self._conversations:
             return ""
-            
-        recent = list(self._conversations[user_id])[-max_items:]
+
+        # Re-submits of a query see the same context as its first run, so their stages can be reused
+        exchanges = [e for e in self._conversations[user_id] if e['query'] != exclude_query]
+        recent = exchanges[-max_items:]
         
         context_parts = []
         for exchange in recent:
@@ -0,0 +1,136 @@
+from typing import Dict, Iterator, Optional, Tuple
+from types import MappingProxyType
+import json
+import os
+from agents.roles import AGENT_ROLES
+from agents.usage import max_tokens_for_role
+
+# Roles the swarm can't run without
+REQUIRED_ROLES = ("triage", "synthesizer")
+# Prompt variants kept per role before the cache is reset
+PROMPT_CACHE_SIZE = 1024
+
+class CompiledRole:
+    """Immutable, validated role with memoized prompt variants"""
+    __slots__ = ("id", "name", "system", "parameters", "defaults", "_prompts", "_max_tokens")
+
+    def __init__(self, role_id: str, spec: Dict):
+        if not isinstance(spec, dict) or not spec.get("name") or not spec.get("system"):
+            raise ValueError(f"Role '{role_id}' needs a 'name' and a 'system' prompt")
+
+        parameters = {}
+        for param, limits in spec.get("parameters", {}).items():
+            low, high = limits.get("min", 0), limits.get("max", 100)
+            default = limits.get("default", low)
+            if not all(isinstance(v, (int, float)) for v in (low, high, default)) or not low <= default <= high:
+                raise ValueError(
+                    f"Invalid range for parameter '{param}' of role '{role_id}': "
+                    f"expected min <= default <= max, got {low}, {default}, {high}"
+                )
+            parameters[param] = MappingProxyType(dict(limits, min=low, max=high, default=default))
+
+        set_ = object.__setattr__
+        set_(self, "id", role_id)
+        set_(self, "name", spec["name"])
+        set_(self, "system", spec["system"])
+        set_(self, "parameters", MappingProxyType(parameters))
+        set_(self, "defaults", MappingProxyType({k: v["default"] for k, v in parameters.items()}))
+        set_(self, "_prompts", {})
+        set_(self, "_max_tokens", {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledRole is immutable")
+
+    def __repr__(self) -> str:
+        return f"CompiledRole({self.id!r})"
+
+    def normalize(self, role_params: Optional[Dict]) -> Tuple:
+        """Drop unknown parameters and clamp values, in the role's own parameter order"""
+        if not role_params:
+            return ()
+        normalized = []
+        for param, limits in self.parameters.items():
+            if role_params.get(param) is not None:
+                value = min(max(role_params[param], limits["min"]), limits["max"])
+                normalized.append((param, value))
+        return tuple(normalized)
+
+    def system_prompt(self, role_params: Optional[Dict] = None) -> str:
+        """Get the system prompt for a set of parameters"""
+        key = self.normalize(role_params)
+        prompt = self._prompts.get(key)
+        if prompt is None:
+            # Keep the role text first so the prompt prefix is identical across calls
+            prompt = self.system
+            if key:
+                param_context = "\nParameters:\n"
+                for param, value in key:
+                    param_context += f"- {param}: {value}%\n"
+                prompt = f"{prompt}\n{param_context}"
+            if len(self._prompts) >= PROMPT_CACHE_SIZE:
+                self._prompts.clear()
+            self._prompts[key] = prompt
+        return prompt
+
+    def max_tokens(self, role_params: Optional[Dict], base: int, minimum: int) -> int:
+        """Get the completion cap for a set of parameters"""
+        key = (self.normalize(role_params), base, minimum)
+        if key not in self._max_tokens:
+            if len(self._max_tokens) >= PROMPT_CACHE_SIZE:
+                self._max_tokens.clear()
+            self._max_tokens[key] = max_tokens_for_role(dict(self.defaults), dict(key[0]), base, minimum)
+        return self._max_tokens[key]
+
+class RoleRegistry:
+    def __init__(self, roles: Dict[str, Dict]):
+        missing = [role_id for role_id in REQUIRED_ROLES if role_id not in roles]
+        if missing:
+            raise ValueError(f"Missing required roles: {', '.join(missing)}")
+        self._roles = MappingProxyType({
+            role_id: CompiledRole(role_id, spec) for role_id, spec in roles.items()
+        })
+
+    @classmethod
+    def from_file(cls, path: str) -> "RoleRegistry":
+        """Load roles from a JSON or YAML roles file"""
+        with open(path, encoding="utf-8") as f:
+            if path.endswith((".yaml", ".yml")):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ValueError("PyYAML is required to load YAML roles files, run: pip install pyyaml")
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+
+        # Accept both a bare mapping of roles and one wrapped in a "roles" key
+        if isinstance(data, dict) and isinstance(data.get("roles"), dict):
+            data = data["roles"]
+        if not isinstance(data, dict):
+            raise ValueError(f"Roles file {path} must contain a mapping of role ids to roles")
+        return cls(data)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "RoleRegistry":
+        """Load roles from a file if configured, otherwise use the built-in roles"""
+        if path:
+            if not os.path.exists(path):
+                raise ValueError(f"Roles file not found: {path}")
+            return cls.from_file(path)
+        return cls(AGENT_ROLES)
+
+    def __getitem__(self, role_id: str) -> CompiledRole:
+        return self._roles[role_id]
+
+    def __contains__(self, role_id: str) -> bool:
+        return role_id in self._roles
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._roles)
+
+    def parameters(self) -> Dict[str, Dict]:
+        """Get the tunable parameters of every role that has any"""
+        return {
+            role_id: {param: dict(limits) for param, limits in role.parameters.items()}
+            for role_id, role in self._roles.items() if role.parameters
+        }
@@ -6,7 +6,12 @@ AGENT_ROLES = {
         SIMPLE: <your direct response>
         
         For complex queries that need deeper analysis, ONLY respond with:
-        COMPLEX
+        COMPLEX: <tier>
+        
+        Where <tier> is the depth of analysis needed:
+        1 - Needs a considered answer but no breakdown
+        2 - Needs the query broken down before answering
+        3 - Needs research, critical analysis and creative exploration
         
         Examples of SIMPLE queries:
         - Greetings/farewells
@@ -0,0 +1,93 @@
+from typing import Dict, List, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+
+# Requests without a user id all share this one, so it's exempt from the per-user cap
+ANONYMOUS_USER = "default"
+
+class FairScheduler:
+    def __init__(self, max_concurrency: int = 16, user_concurrency: int = 4, weights: Dict[str, float] = None):
+        # Weighted fair queueing over (frontend, user) flows, 0 concurrency disables scheduling
+        self.max_concurrency = max_concurrency
+        self.user_concurrency = user_concurrency
+        self.weights = weights or {}
+        self._queue: List[Tuple] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[Tuple[str, str], float] = {}
+        self._running = 0
+        self._running_per_user: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, frontend: str = "default"):
+        """Hold one agent call slot, waiting for this flow's fair turn"""
+        if not self.max_concurrency:
+            yield
+            return
+        await self._acquire(user_id, frontend)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    async def _acquire(self, user_id: str, frontend: str):
+        weight = self.weights.get(frontend, self.weights.get("default", 1))
+        flow = (frontend, user_id)
+
+        # Each call costs 1/weight of virtual time, so heavier classes get more turns
+        start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        finish = start + 1.0 / weight
+        self._last_finish[flow] = finish
+
+        granted = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._sequence), start, user_id, granted))
+        self._dispatch()
+        try:
+            await granted
+        except asyncio.CancelledError:
+            # Cancelled right after being granted, give the slot back
+            if granted.done() and not granted.cancelled():
+                self._release(user_id)
+            raise
+
+    def _release(self, user_id: str):
+        self._running -= 1
+        self._running_per_user[user_id] -= 1
+        if not self._running_per_user[user_id]:
+            del self._running_per_user[user_id]
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots in virtual finish order, skipping users at their cap"""
+        deferred = []
+        while self._queue and self._running < self.max_concurrency:
+            entry = heapq.heappop(self._queue)
+            _, _, start, user_id, granted = entry
+            if granted.done():
+                # Waiter was cancelled while queued
+                continue
+            if user_id != ANONYMOUS_USER and self._running_per_user.get(user_id, 0) >= self.user_concurrency:
+                deferred.append(entry)
+                continue
+            self._running += 1
+            self._running_per_user[user_id] = self._running_per_user.get(user_id, 0) + 1
+            self._virtual_time = max(self._virtual_time, start)
+            granted.set_result(None)
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+
+        # Flows that are behind the virtual clock behave like new ones, forget them
+        if len(self._last_finish) > 10000:
+            self._last_finish = {
+                flow: finish for flow, finish in self._last_finish.items() if finish > self._virtual_time
+            }
+
+    def stats(self) -> Dict:
+        """Get current scheduler load"""
+        return {
+            "running": self._running,
+            "queued": sum(1 for entry in self._queue if not entry[-1].done()),
+            "users_running": len(self._running_per_user)
+        }
@@ -0,0 +1,48 @@
+from typing import Dict, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import time
+
+def stage_key(*inputs) -> str:
+    """Hash the inputs that fully determine a stage's output"""
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class StageCache:
+    def __init__(self, max_items: int = 512, ttl_seconds: float = 3600):
+        # LRU of stage outputs keyed by input hash, 0 items disables caching
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self.max_items = max_items
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a stored stage output if it hasn't expired"""
+        entry = self._items.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, output: str):
+        """Store a stage output, evicting the least recently used ones"""
+        if not self.max_items or not output:
+            return
+        self._items[key] = (time.monotonic(), output)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._items),
+            "hits": self.hits,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
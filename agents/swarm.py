@@ -1,7 +1,7 @@
-from typing import Dict, Optional, AsyncGenerator
+from typing import Dict, List, Optional, AsyncGenerator
 import asyncio
-from groq import AsyncGroq
-from openai import AsyncOpenAI
+import re
+import time
 from config.settings import (
     GROQ_API_KEY, 
     OPENAI_API_KEY,
@@ -15,98 +15,230 @@ from config.settings import (
     RETRY_DELAY,
     USE_MEMORY,
     MAX_MEMORY_ITEMS,
-    MEMORY_MAX_AGE_HOURS
+    MEMORY_MAX_AGE_HOURS,
+    ROLE_MAX_TOKENS,
+    MIN_MAX_TOKENS,
+    USER_TOKEN_BUDGET,
+    TOKEN_BUDGET_WINDOW_HOURS,
+    COMPLEXITY_TIERS,
+    DEFAULT_COMPLEXITY_TIER,
+    ROLES_FILE,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+    HTTP_TIMEOUT,
+    WARMUP_CONNECTIONS,
+    WARMUP_TIMEOUT,
+    KEEP_WARM_INTERVAL,
+    DEFAULT_LATENCY_BUDGET,
+    OPTIONAL_STAGES,
+    DEGRADE_MIN_SCALE,
+    STAGE_LATENCY_ESTIMATE,
+    RESEARCH_FAN_OUT,
+    FAN_OUT_WIDTH,
+    FAN_OUT_MAX_QUESTIONS,
+    FAN_OUT_TOKEN_SCALE,
+    SCHEDULER_MAX_CONCURRENCY,
+    SCHEDULER_USER_CONCURRENCY,
+    FRONTEND_WEIGHTS,
+    STAGE_CACHE_SIZE,
+    STAGE_CACHE_TTL_SECONDS,
+    LOCAL_TRIAGE,
+    LOCAL_TRIAGE_THRESHOLD,
+    TRIAGE_MODEL_FILE,
+    TRIAGE_LOG_FILE,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_SAMPLE_RATE,
+    LOG_MAX_BODY_CHARS,
+    LOG_QUEUE_SIZE
 )
-from agents.roles import AGENT_ROLES
+from agents.registry import CompiledRole, RoleRegistry
 from agents.memory import ConversationMemory
+from agents.connections import ConnectionPool
+from agents.deadline import Deadline, DeadlineExceeded
+from agents.scheduler import FairScheduler
+from agents.stage_cache import StageCache, stage_key
+from agents.triage import SIMPLE, TriageClassifier, TriageLog, triage_label
+from agents.logs import QueryLogger, new_query_logger, query_logger, setup_logging
+from agents.usage import UsageTracker, estimate_tokens
+
+# Swarm stages after triage, in pipeline order
+STAGE_ORDER = ["interpreter", "researcher", "critic", "creative", "synthesizer"]
+STAGE_LABELS = {
+    "interpreter": "Interpretation",
+    "researcher": "Research Points",
+    "critic": "Critical Analysis",
+    "creative": "Creative Perspectives"
+}
 
 class AgentSwarm:
     def __init__(self):
-        # Select provider based on available API key
+        # Logs are written off the event loop, correlated by query id
+        setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE)
+
+        # Tuned HTTP client shared by every call to the provider
+        self.connections = ConnectionPool(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            http2=HTTP2_ENABLED,
+            timeout=HTTP_TIMEOUT
+        )
+
+        # Select provider based on available API key, only importing its SDK
         if OPENAI_API_KEY:
+            from openai import AsyncOpenAI
             self.client = AsyncOpenAI(
                 api_key=OPENAI_API_KEY,
-                base_url=OPENAI_BASE_URL
+                base_url=OPENAI_BASE_URL,
+                http_client=self.connections.create_client()
             )
             self.model = OPENAI_MODEL
             self.provider = "openai"
         elif GROQ_API_KEY:
-            self.client = AsyncGroq(api_key=GROQ_API_KEY)
+            from groq import AsyncGroq
+            self.client = AsyncGroq(
+                api_key=GROQ_API_KEY,
+                http_client=self.connections.create_client()
+            )
             self.model = GROQ_MODEL
             self.provider = "groq"
         elif HEURIST_API_KEY:
+            from openai import AsyncOpenAI
             self.client = AsyncOpenAI(
                 api_key=HEURIST_API_KEY,
-                base_url=HEURIST_BASE_URL
+                base_url=HEURIST_BASE_URL,
+                http_client=self.connections.create_client()
             )
             self.model = HEURIST_MODEL
             self.provider = "heurist"
         else:
             raise ValueError("No API keys configured. Please add one in settings.py")
+        self.roles = RoleRegistry.load(ROLES_FILE)
         self.memory = ConversationMemory(
             max_history=MAX_MEMORY_ITEMS,
             max_age_hours=MEMORY_MAX_AGE_HOURS
         ) if USE_MEMORY else None
-
-    async def handle_streaming_response(self, stream) -> str:
-        """Handle streaming response from Heurist"""
+        self.usage = UsageTracker(
+            user_budget=USER_TOKEN_BUDGET,
+            window_hours=TOKEN_BUDGET_WINDOW_HOURS
+        )
+        self.scheduler = FairScheduler(
+            max_concurrency=SCHEDULER_MAX_CONCURRENCY,
+            user_concurrency=SCHEDULER_USER_CONCURRENCY,
+            weights=FRONTEND_WEIGHTS
+        )
+        self.stage_cache = StageCache(
+            max_items=STAGE_CACHE_SIZE,
+            ttl_seconds=STAGE_CACHE_TTL_SECONDS
+        )
+        # Without a trained model the rules still route, an untrained model is never confident
+        self.triage_classifier = (TriageClassifier.load(TRIAGE_MODEL_FILE) or TriageClassifier()) if LOCAL_TRIAGE else None
+        self.triage_log = TriageLog(TRIAGE_LOG_FILE) if TRIAGE_LOG_FILE else None
+        # Typical full-length latency per stage, used to plan runs with a deadline
+        self.stage_latency: Dict[str, float] = {}
+
+    async def warm_up(self):
+        """Pre-establish provider connections and keep them warm while idle"""
+        await self.connections.warm_up(self.client, WARMUP_CONNECTIONS, WARMUP_TIMEOUT)
+        self.connections.start_keep_warm(self.client, KEEP_WARM_INTERVAL, WARMUP_CONNECTIONS, WARMUP_TIMEOUT)
+
+    def _build_request(self, role: CompiledRole, context: str, parameters: Optional[Dict] = None, stream: bool = False, max_tokens_scale: float = 1.0) -> Dict:
+        """Build the provider request for a single agent call"""
+        # Get role parameters, the API sends them keyed by role id
+        role_params = parameters.get(role.id) if parameters else None
+
+        # The system prompt is the stable prefix, the per-query context goes last
+        messages = [
+            {
+                "role": "system",
+                "content": role.system_prompt(role_params)
+            },
+            {
+                "role": "user",
+                "content": context
+            }
+        ]
+
+        # Handle provider-specific parameters
+        params = {
+            "messages": messages,
+            "model": self.model,
+            "max_tokens": max(MIN_MAX_TOKENS, int(max_tokens_scale * role.max_tokens(
+                role_params,
+                ROLE_MAX_TOKENS.get(role.id, ROLE_MAX_TOKENS["synthesizer"]),
+                MIN_MAX_TOKENS
+            )))
+        }
+        if stream:
+            params["stream"] = True
+
+        if self.provider == "openai":
+            params["temperature"] = 0.7
+            if stream:
+                params["stream_options"] = {"include_usage": True}
+        elif self.provider == "heurist":
+            params["temperature"] = 0.7
+
+        return params
+
+    @staticmethod
+    def _extract_usage(response) -> Optional[tuple]:
+        """Get (prompt_tokens, completion_tokens) reported by the provider"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            # Groq reports streaming usage on the final chunk under x_groq
+            usage = getattr(getattr(response, "x_groq", None), "usage", None)
+        if usage is None:
+            return None
+        return (usage.prompt_tokens or 0, usage.completion_tokens or 0)
+
+    def _record_usage(self, role: CompiledRole, params: Dict, text: str, reported: Optional[tuple], usage: Optional[Dict]):
+        """Record usage of an agent call, estimating it if the provider didn't report any"""
+        if reported is None:
+            prompt = "".join(message["content"] for message in params["messages"])
+            reported = (estimate_tokens(prompt), estimate_tokens(text))
+        self.usage.record(usage, role.id, *reported)
+
+    async def handle_streaming_response(self, stream) -> tuple:
+        """Handle streaming response from Heurist, returns the text and reported usage"""
         full_response = []
+        reported = None
         async for chunk in stream:
-            if hasattr(chunk.choices[0].delta, "content"):
+            reported = self._extract_usage(chunk) or reported
+            if chunk.choices and hasattr(chunk.choices[0].delta, "content"):
                 content = chunk.choices[0].delta.content
                 if content is not None:
                     full_response.append(content)
-        return "".join(full_response)
+        return "".join(full_response), reported
 
-    async def query_agent(self, role: Dict, context: str, parameters: Optional[Dict] = None) -> str:
+    def _slot(self, usage: Optional[Dict]):
+        """Get a fair-scheduled provider slot for the query's user and frontend"""
+        if usage is None:
+            return self.scheduler.slot("default")
+        return self.scheduler.slot(usage["user_id"], usage["frontend"])
+
+    async def query_agent(self, role: CompiledRole, context: str, parameters: Optional[Dict] = None, usage: Optional[Dict] = None, max_tokens_scale: float = 1.0) -> str:
         """Query a single agent with retry logic and custom parameters"""
         for attempt in range(MAX_RETRIES):
             try:
-                # Get role parameters
-                role_params = {}
-                if parameters and role["name"].lower().replace(" ", "_") in parameters:
-                    role_params = parameters[role["name"].lower().replace(" ", "_")]
-                
-                # Modify system prompt based on parameters
-                system_prompt = role["system"]
-                if role_params:
-                    param_context = "\nParameters:\n"
-                    for param, value in role_params.items():
-                        param_context += f"- {param}: {value}%\n"
-                    system_prompt = f"{system_prompt}\n{param_context}"
-
-                messages = [
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": context
-                    }
-                ]
-                
-                # Handle provider-specific parameters
-                params = {
-                    "messages": messages,
-                    "model": self.model,
-                }
-                
-                if self.provider == "openai":
-                    params["temperature"] = 0.7
-                elif self.provider == "heurist":
-                    params["temperature"] = 0.7
-                    params["max_tokens"] = 64
-                    params["stream"] = True
-                
-                completion = await self.client.chat.completions.create(**params)
-                
-                # Handle streaming response for Heurist
-                if self.provider == "heurist":
-                    return await self.handle_streaming_response(completion)
-                
-                # Handle regular response for other providers
-                return completion.choices[0].message.content
+                params = self._build_request(role, context, parameters, stream=self.provider == "heurist", max_tokens_scale=max_tokens_scale)
+
+                async with self._slot(usage):
+                    completion = await self.client.chat.completions.create(**params)
+
+                    # Handle streaming response for Heurist
+                    if self.provider == "heurist":
+                        text, reported = await self.handle_streaming_response(completion)
+                    else:
+                        # Handle regular response for other providers
+                        text = completion.choices[0].message.content
+                        reported = self._extract_usage(completion)
+
+                self._record_usage(role, params, text, reported, usage)
+                return text
             except Exception as e:
                 if attempt == MAX_RETRIES - 1:
                     raise e
@@ -117,24 +249,295 @@ class AgentSwarm:
         # Remove the "SIMPLE: " prefix and any extra whitespace
         return triage_response.replace("SIMPLE:", "").strip()
 
-    async def process_query(self, user_query: str, telegram_mode: bool = False, user_id: str = "default") -> str:
+    def _complexity_tier(self, triage_response: str) -> int:
+        """Parse the complexity tier from a 'COMPLEX: <tier>' triage response"""
+        match = re.search(r"COMPLEX\W*(\d+)", triage_response)
+        if match and int(match.group(1)) in COMPLEXITY_TIERS:
+            return int(match.group(1))
+        return DEFAULT_COMPLEXITY_TIER
+
+    def _local_triage(self, user_query: str, context_info: str, log: QueryLogger) -> Optional[str]:
+        """Triage a query without the LLM when the local classifier is confident it's complex"""
+        # Follow-ups only make sense with the conversation, which the classifier doesn't see
+        if self.triage_classifier is None or context_info:
+            return None
+        label, confidence = self.triage_classifier.predict(user_query)
+        if label == SIMPLE or confidence < LOCAL_TRIAGE_THRESHOLD:
+            # Simple queries still go to the LLM, its triage answer is the response
+            return None
+        log.info("Local triage: tier %s (%.0f%% confident)", label, confidence * 100)
+        return f"COMPLEX: {label}"
+
+    def _log_triage(self, user_query: str, triage_response: str, reused: List[str]):
+        """Log an LLM triage decision as training data for the local classifier"""
+        if self.triage_log is not None and "triage" not in reused:
+            self.triage_log.record(user_query, triage_label(triage_response, self._complexity_tier(triage_response)))
+
+    def _pipeline(self, tier: int) -> List[str]:
+        """Get the stages to run for a complexity tier, always ending with synthesis"""
+        selected = COMPLEXITY_TIERS.get(tier, COMPLEXITY_TIERS[DEFAULT_COMPLEXITY_TIER])
+        stages = [key for key in STAGE_ORDER if key in selected and key in self.roles]
+        if "synthesizer" not in stages:
+            stages.append("synthesizer")
+        return stages
+
+    def _stage_context(self, role_key: str, user_query: str, context_info: str, outputs: Dict[str, str]) -> str:
+        """Build the input of a stage from the outputs of the stages that ran before it"""
+        if role_key == "interpreter":
+            return f"Analyze this query considering the conversation context:\n{context_info}\nQuery: '{user_query}'"
+
+        if role_key == "synthesizer":
+            sections = "".join(
+                f"""
+        {STAGE_LABELS[key]}: {outputs[key]}
+        """ for key in STAGE_ORDER if key in outputs
+            )
+            if not outputs and context_info:
+                sections = f"""
+        {context_info}
+        """
+            return f"""
+        Original Query: {user_query}
+        {sections}
+        Please synthesize all this information into a comprehensive response.
+        """
+
+        # Intermediate stages build on the latest output, or the query itself when they run first
+        previous = list(outputs.values())[-1] if outputs else f"Query: '{user_query}'"
+        if role_key == "researcher":
+            return f"Based on this interpretation:\n{previous}\nWhat specific aspects need investigation?"
+        if role_key == "critic":
+            return f"Critically analyze these research points:\n{previous}"
+        return f"Given this analysis:\n{previous}\nExplore creative perspectives and alternatives."
+
+    def _start_query(self, user_query: str, user_id: str, frontend: str) -> tuple:
+        """Open the usage record of a query and a logger bound to its correlation id"""
+        log = new_query_logger(LOG_SAMPLE_RATE, LOG_MAX_BODY_CHARS)
+        query_usage = self.usage.start_query(user_id, frontend)
+        query_usage["query_id"] = log.query_id
+        log.info("Processing query from %s via %s", user_id, frontend)
+        log.body("query", user_query)
+        return query_usage, log
+
+    def _new_deadline(self, latency_budget: Optional[float]) -> Deadline:
+        """Create the deadline of a run, falling back to the configured default budget"""
+        return Deadline(
+            latency_budget if latency_budget is not None else DEFAULT_LATENCY_BUDGET,
+            OPTIONAL_STAGES,
+            DEGRADE_MIN_SCALE
+        )
+
+    def _plan_stage(self, role_key: str, deadline: Deadline, log: QueryLogger) -> Optional[tuple]:
+        """Plan a stage against the deadline, keeping time back for synthesis"""
+        expected = self.stage_latency.get(role_key, STAGE_LATENCY_ESTIMATE)
+        reserve = self.stage_latency.get("synthesizer", STAGE_LATENCY_ESTIMATE)
+        plan = deadline.plan(role_key, expected, reserve)
+        if plan is None:
+            log.info("Skipping %s to meet the deadline", role_key)
+        return plan
+
+    def _triage_timeout(self, deadline: Deadline) -> Optional[float]:
+        """Time triage may take, so a fallback synthesis still fits in the deadline"""
+        return deadline.triage_timeout(self.stage_latency.get("synthesizer", STAGE_LATENCY_ESTIMATE))
+
+    def _triage_timed_out(self, deadline: Deadline, log: QueryLogger) -> str:
+        """Triage answer used when the deadline passes before triage does, runs synthesis only"""
+        deadline.skip("triage")
+        log.warning("triage ran out of time, continuing with synthesis only")
+        return f"COMPLEX: {min(COMPLEXITY_TIERS)}"
+
+    def _final_answer(self, outputs: Dict[str, str], deadline: Deadline) -> str:
+        """The synthesis, or the latest stage output when synthesis didn't make the deadline"""
+        for role_key in reversed(STAGE_ORDER):
+            if outputs.get(role_key):
+                return outputs[role_key]
+        # An empty answer is a failure to meet the deadline, not a response
+        if deadline.summary()["degraded"]:
+            raise DeadlineExceeded(f"No answer within the latency budget: {deadline.summary()}")
+        return ""
+
+    async def _next_chunk(self, agent_stream: AsyncGenerator[str, None], expires: Optional[float]) -> Optional[str]:
+        """Get a stream's next chunk, or None at its end; raises TimeoutError once expires passes"""
+        timeout = None if expires is None else max(0.0, expires - time.monotonic())
+        try:
+            return await asyncio.wait_for(agent_stream.__anext__(), timeout)
+        except StopAsyncIteration:
+            return None
+
+    def _observe_latency(self, role_key: str, seconds: float, scale: float):
+        """Update the moving average of a stage's full-length latency"""
+        full_length = seconds / scale if scale else seconds
+        previous = self.stage_latency.get(role_key)
+        self.stage_latency[role_key] = full_length if previous is None else 0.8 * previous + 0.2 * full_length
+
+    def _parse_sub_questions(self, research: str) -> List[str]:
+        """Split the researcher's output into its numbered or bulleted sub-questions"""
+        questions = []
+        for line in research.splitlines():
+            match = re.match(r"^\s*(?:\d+[.)]|[-*•])\s+(.+)", line)
+            if match and len(match.group(1).strip()) > 10:
+                questions.append(match.group(1).strip())
+        return questions[:FAN_OUT_MAX_QUESTIONS]
+
+    def _use_fan_out(self, role_key: str, outputs: Dict[str, str]) -> bool:
+        """Whether the critic stage should fan out over the researcher's sub-questions"""
+        return (
+            RESEARCH_FAN_OUT and role_key == "critic" and "researcher" in outputs
+            and len(self._parse_sub_questions(outputs["researcher"])) >= 2
+        )
+
+    def _sub_question_calls(self, research: str, parameters: Optional[Dict], usage: Dict, scale: float) -> List:
+        """Create short, width-bounded critic calls, one per sub-question"""
+        width = asyncio.Semaphore(max(1, FAN_OUT_WIDTH))
+
+        async def analyze(question: str) -> str:
+            async with width:
+                analysis = await self.query_agent(
+                    self.roles["critic"],
+                    f"Critically analyze this research question in a few sentences:\n{question}",
+                    parameters,
+                    usage=usage,
+                    max_tokens_scale=scale * FAN_OUT_TOKEN_SCALE
+                )
+            return f"- {question}\n{analysis}\n"
+
+        return [analyze(question) for question in self._parse_sub_questions(research)]
+
+    async def _fan_out(self, research: str, parameters: Optional[Dict], usage: Dict, scale: float) -> str:
+        """Analyze sub-questions in parallel and reduce them into one critic output"""
+        results = await asyncio.gather(
+            *self._sub_question_calls(research, parameters, usage, scale),
+            return_exceptions=True
+        )
+        analyses = []
+        for result in results:
+            if isinstance(result, Exception):
+                query_logger(usage).warning("Sub-question analysis failed: %s", result)
+            else:
+                analyses.append(result)
+        if analyses:
+            return "\n".join(analyses)
+        return await self._single_critic(research, parameters, usage, scale)
+
+    async def _single_critic(self, research: str, parameters: Optional[Dict], usage: Dict, scale: float) -> str:
+        """Critic call over the whole research, used when every sub-question analysis failed"""
+        query_logger(usage).warning("Every sub-question analysis failed, falling back to a single critic call")
+        return await self.query_agent(
+            self.roles["critic"],
+            self._stage_context("critic", "", "", {"researcher": research}),
+            parameters,
+            usage=usage,
+            max_tokens_scale=scale
+        )
+
+    async def _fan_out_stream(self, research: str, parameters: Optional[Dict], usage: Dict, scale: float) -> AsyncGenerator[str, None]:
+        """Stream each sub-question analysis as soon as it finishes"""
+        tasks = [asyncio.ensure_future(call) for call in self._sub_question_calls(research, parameters, usage, scale)]
+        succeeded = False
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    yield await next_done + "\n"
+                    succeeded = True
+                except Exception as e:
+                    query_logger(usage).warning("Sub-question analysis failed: %s", e)
+            if not succeeded:
+                yield await self._single_critic(research, parameters, usage, scale)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _stage_key(self, role_key: str, context: str, parameters: Optional[Dict], scale: float = 1.0) -> str:
+        """Hash everything that determines a stage's output: its prompts, parameters and length"""
+        request = self._build_request(self.roles[role_key], context, parameters, max_tokens_scale=scale)
+        return stage_key(self.provider, request["model"], request["max_tokens"], request["messages"])
+
+    def _stage_input(self, role_key: str, user_query: str, context_info: str, outputs: Dict[str, str]) -> str:
+        """Get the input a stage will run on, fan-out included"""
+        if self._use_fan_out(role_key, outputs):
+            return f"Fan-out ({FAN_OUT_MAX_QUESTIONS} questions at {FAN_OUT_TOKEN_SCALE}) over:\n{outputs['researcher']}"
+        return self._stage_context(role_key, user_query, context_info, outputs)
+
+    async def _cached_query(self, role_key: str, context: str, parameters: Optional[Dict], usage: Dict, reused: List[str]) -> str:
+        """Query an agent unless the exact same inputs were answered before"""
+        key = self._stage_key(role_key, context, parameters)
+        output = self.stage_cache.get(key)
+        if output is not None:
+            reused.append(role_key)
+            return output
+        output = await self.query_agent(self.roles[role_key], context, parameters, usage=usage)
+        self.stage_cache.put(key, output)
+        return output
+
+    async def _run_stage(self, role_key: str, user_query: str, context_info: str, outputs: Dict[str, str], parameters: Optional[Dict], usage: Dict, deadline: Deadline, reused: List[str]) -> Optional[str]:
+        """Run a stage within the deadline, returns None if it was skipped"""
+        # A full-length output for the same inputs is reused without spending any time
+        stage_input = self._stage_input(role_key, user_query, context_info, outputs)
+        cached = self.stage_cache.get(self._stage_key(role_key, stage_input, parameters))
+        if cached is not None:
+            reused.append(role_key)
+            return cached
+
+        plan = self._plan_stage(role_key, deadline, query_logger(usage))
+        if plan is None:
+            return None
+        scale, timeout = plan
+
+        if self._use_fan_out(role_key, outputs):
+            call = self._fan_out(outputs["researcher"], parameters, usage, scale)
+        else:
+            call = self.query_agent(
+                self.roles[role_key],
+                stage_input,
+                parameters,
+                usage=usage,
+                max_tokens_scale=scale
+            )
+
+        started = time.monotonic()
+        try:
+            output = await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            deadline.skip(role_key)
+            query_logger(usage).warning("%s ran out of time, continuing without it", role_key)
+            return None
+        self._observe_latency(role_key, time.monotonic() - started, scale)
+        self.stage_cache.put(self._stage_key(role_key, stage_input, parameters, scale), output)
+        return output
+
+    async def process_query(self, user_query: str, telegram_mode: bool = False, user_id: str = "default", parameters: Optional[Dict] = None, latency_budget: Optional[float] = None, frontend: Optional[str] = None) -> str:
         """Process a user query through the agent swarm"""
-        print(f"\n🤔 Processing query: '{user_query}'\n")
+        self.usage.check_budget(user_id)
+        frontend = frontend or ("telegram" if telegram_mode else "default")
+        query_usage, log = self._start_query(user_query, user_id, frontend)
+        deadline = self._new_deadline(latency_budget)
 
         # Get conversation context if memory is enabled
         context_info = ""
         if self.memory:
-            context = self.memory.get_context(user_id)
+            context = self.memory.get_context(user_id, exclude_query=user_query)
             if context:
                 context_info = f"\nPrevious conversation:\n{context}"
 
-        # Step 0: Triage the query
-        triage_response = await self.query_agent(
-            AGENT_ROLES["triage"],
-            f"Evaluate this query: '{user_query}'{context_info}"
-        )
-        print(f"🔄 {AGENT_ROLES['triage']['name']}:")
-        print(triage_response + "\n")
+        # Step 0: Triage the query, locally when the classifier is confident
+        reused = []
+        triage_response = self._local_triage(user_query, context_info, log)
+        if triage_response is None:
+            try:
+                triage_response = await asyncio.wait_for(
+                    self._cached_query(
+                        "triage",
+                        f"Evaluate this query: '{user_query}'{context_info}",
+                        None,
+                        query_usage,
+                        reused
+                    ),
+                    self._triage_timeout(deadline)
+                )
+                self._log_triage(user_query, triage_response, reused)
+            except asyncio.TimeoutError:
+                triage_response = self._triage_timed_out(deadline, log)
+        log.body("triage", triage_response)
 
         # If it's a simple query, handle and store response
         if triage_response.startswith("SIMPLE:"):
@@ -143,76 +546,46 @@ class AgentSwarm:
                 self.memory.add_exchange(user_id, user_query, response)
             return response
 
-        # For complex queries, proceed with full swarm analysis
-        print("⚡ Activating full agent swarm for complex query...\n")
-
-        # Update interpreter prompt to include context
-        interpreter_response = await self.query_agent(
-            AGENT_ROLES["interpreter"],
-            f"Analyze this query considering the conversation context:\n{context_info}\nQuery: '{user_query}'"
-        )
-        print(f"🔍 {AGENT_ROLES['interpreter']['name']}:")
-        print(interpreter_response + "\n")
-
-        # Step 2: Research Planning
-        researcher_response = await self.query_agent(
-            AGENT_ROLES["researcher"],
-            f"Based on this interpretation:\n{interpreter_response}\nWhat specific aspects need investigation?"
-        )
-        print(f"📚 {AGENT_ROLES['researcher']['name']}:")
-        print(researcher_response + "\n")
-
-        # Step 3: Critical Analysis
-        critic_response = await self.query_agent(
-            AGENT_ROLES["critic"],
-            f"Critically analyze these research points:\n{researcher_response}"
-        )
-        print(f"⚖️ {AGENT_ROLES['critic']['name']}:")
-        print(critic_response + "\n")
+        # For complex queries, run the stages selected by the complexity tier
+        tier = self._complexity_tier(triage_response)
+        log.info("Running tier %d pipeline", tier)
+
+        outputs = {}
+        for role_key in self._pipeline(tier):
+            output = await self._run_stage(
+                role_key,
+                user_query,
+                context_info,
+                outputs,
+                parameters,
+                query_usage,
+                deadline,
+                reused
+            )
+            if output is None:
+                continue
+            outputs[role_key] = output
+            log.body(role_key, outputs[role_key])
 
-        # Step 4: Creative Exploration
-        creative_response = await self.query_agent(
-            AGENT_ROLES["creative"],
-            f"Given this analysis:\n{critic_response}\nExplore creative perspectives and alternatives."
-        )
-        print(f"💡 {AGENT_ROLES['creative']['name']}:")
-        print(creative_response + "\n")
+        final_response = self._final_answer(outputs, deadline)
+        if deadline.summary()["degraded"]:
+            log.warning("Degraded to meet the deadline", extra={"fields": deadline.summary()})
 
-        # Step 5: Final Synthesis
-        synthesis_context = f"""
-        Original Query: {user_query}
-        
-        Interpretation: {interpreter_response}
-        
-        Research Points: {researcher_response}
-        
-        Critical Analysis: {critic_response}
-        
-        Creative Perspectives: {creative_response}
-        
-        Please synthesize all this information into a comprehensive response.
-        """
-        
-        final_response = await self.query_agent(
-            AGENT_ROLES["synthesizer"],
-            synthesis_context
-        )
-        print(f"🎯 {AGENT_ROLES['synthesizer']['name']} - Final Response:")
-        print(final_response + "\n")
-        
         # Store the final response if memory is enabled
         if self.memory:
             self.memory.add_exchange(user_id, user_query, final_response)
         return final_response 
 
-    async def process_query_with_details(self, user_query: str, user_id: str = "default") -> dict:
+    async def process_query_with_details(self, user_query: str, user_id: str = "default", parameters: Optional[Dict] = None, latency_budget: Optional[float] = None, frontend: str = "default") -> dict:
         """Process a query and return all agent responses"""
-        print(f"\n🤔 Processing query: '{user_query}'\n")
+        self.usage.check_budget(user_id)
+        query_usage, log = self._start_query(user_query, user_id, frontend)
+        deadline = self._new_deadline(latency_budget)
 
         # Get conversation context if memory is enabled
         context_info = ""
         if self.memory:
-            context = self.memory.get_context(user_id)
+            context = self.memory.get_context(user_id, exclude_query=user_query)
             if context:
                 context_info = f"\nPrevious conversation:\n{context}"
 
@@ -222,15 +595,33 @@ class AgentSwarm:
             "synthesizer": {"name": "Information Synthesizer", "response": ""}
         }
 
-        # Step 0: Triage the query
-        triage_response = await self.query_agent(
-            AGENT_ROLES["triage"],
-            f"Evaluate this query: '{user_query}'{context_info}"
-        )
-        print(f"🔄 {AGENT_ROLES['triage']['name']}:")
-        print(triage_response + "\n")
+        # Step 0: Triage the query, locally when the classifier is confident
+        reused = []
+        triage_response = self._local_triage(user_query, context_info, log)
+        local_triage = triage_response is not None
+        if triage_response is None:
+            try:
+                triage_response = await asyncio.wait_for(
+                    self._cached_query(
+                        "triage",
+                        f"Evaluate this query: '{user_query}'{context_info}",
+                        None,
+                        query_usage,
+                        reused
+                    ),
+                    self._triage_timeout(deadline)
+                )
+                self._log_triage(user_query, triage_response, reused)
+            except asyncio.TimeoutError:
+                triage_response = self._triage_timed_out(deadline, log)
+        log.body("triage", triage_response)
         
-        response["triage"] = {"name": "Query Triage", "response": triage_response}
+        response["triage"] = {
+            "name": "Query Triage",
+            "response": triage_response,
+            "reused": "triage" in reused,
+            "local": local_triage
+        }
 
         # If it's a simple query, handle and return
         if triage_response.startswith("SIMPLE:"):
@@ -239,70 +630,43 @@ class AgentSwarm:
                 self.memory.add_exchange(user_id, user_query, simple_response)
             response["is_simple_query"] = True
             response["synthesizer"]["response"] = simple_response
+            response["usage"] = query_usage
+            response["query_id"] = log.query_id
             return response
 
-        # For complex queries, proceed with full swarm analysis
-        print("⚡ Activating full agent swarm for complex query...\n")
-
-        # Step 1: Interpretation
-        interpreter_response = await self.query_agent(
-            AGENT_ROLES["interpreter"],
-            f"Analyze this query considering the conversation context:\n{context_info}\nQuery: '{user_query}'"
-        )
-        print(f"🔍 {AGENT_ROLES['interpreter']['name']}:")
-        print(interpreter_response + "\n")
-        response["interpreter"] = {"name": "Query Interpreter", "response": interpreter_response}
-
-        # Step 2: Research
-        researcher_response = await self.query_agent(
-            AGENT_ROLES["researcher"],
-            f"Based on this interpretation:\n{interpreter_response}\nWhat specific aspects need investigation?"
-        )
-        print(f"📚 {AGENT_ROLES['researcher']['name']}:")
-        print(researcher_response + "\n")
-        response["researcher"] = {"name": "Research Specialist", "response": researcher_response}
-
-        # Step 3: Critical Analysis
-        critic_response = await self.query_agent(
-            AGENT_ROLES["critic"],
-            f"Critically analyze these research points:\n{researcher_response}"
-        )
-        print(f"⚖️ {AGENT_ROLES['critic']['name']}:")
-        print(critic_response + "\n")
-        response["critic"] = {"name": "Critical Analyzer", "response": critic_response}
-
-        # Step 4: Creative Exploration
-        creative_response = await self.query_agent(
-            AGENT_ROLES["creative"],
-            f"Given this analysis:\n{critic_response}\nExplore creative perspectives and alternatives."
-        )
-        print(f"💡 {AGENT_ROLES['creative']['name']}:")
-        print(creative_response + "\n")
-        response["creative"] = {"name": "Creative Explorer", "response": creative_response}
+        # For complex queries, run the stages selected by the complexity tier
+        tier = self._complexity_tier(triage_response)
+        log.info("Running tier %d pipeline", tier)
+        response["complexity_tier"] = tier
+
+        outputs = {}
+        for role_key in self._pipeline(tier):
+            output = await self._run_stage(
+                role_key,
+                user_query,
+                context_info,
+                outputs,
+                parameters,
+                query_usage,
+                deadline,
+                reused
+            )
+            if output is None:
+                continue
+            outputs[role_key] = output
+            log.body(role_key, outputs[role_key])
+            response[role_key] = {
+                "name": self.roles[role_key].name,
+                "response": outputs[role_key],
+                "reused": role_key in reused
+            }
 
-        # Step 5: Final Synthesis
-        synthesis_context = f"""
-        Original Query: {user_query}
-        
-        Interpretation: {interpreter_response}
-        
-        Research Points: {researcher_response}
-        
-        Critical Analysis: {critic_response}
-        
-        Creative Perspectives: {creative_response}
-        
-        Please synthesize all this information into a comprehensive response.
-        """
-        
-        final_response = await self.query_agent(
-            AGENT_ROLES["synthesizer"],
-            synthesis_context
-        )
-        print(f"🎯 {AGENT_ROLES['synthesizer']['name']} - Final Response:")
-        print(final_response + "\n")
-        
+        final_response = self._final_answer(outputs, deadline)
         response["synthesizer"]["response"] = final_response
+        response["usage"] = query_usage
+        response["query_id"] = log.query_id
+        response["reused_stages"] = reused
+        response.update(deadline.summary())
 
         # Store the final response if memory is enabled
         if self.memory:
@@ -310,31 +674,67 @@ class AgentSwarm:
 
         return response 
 
-    async def process_query_streaming(self, user_query: str, user_id: str = "default", parameters: Optional[Dict] = None) -> AsyncGenerator[Dict, None]:
+    async def process_query_streaming(self, user_query: str, user_id: str = "default", parameters: Optional[Dict] = None, latency_budget: Optional[float] = None, frontend: str = "default") -> AsyncGenerator[Dict, None]:
         """Process a query and stream the response in real-time"""
-        print(f"\n🤔 Processing query: '{user_query}'\n")
+        self.usage.check_budget(user_id)
+        query_usage, log = self._start_query(user_query, user_id, frontend)
+        deadline = self._new_deadline(latency_budget)
 
         # Get conversation context if memory is enabled
         context_info = ""
         if self.memory:
-            context = self.memory.get_context(user_id)
+            context = self.memory.get_context(user_id, exclude_query=user_query)
             if context:
                 context_info = f"\nPrevious conversation:\n{context}"
 
         # Step 0: Triage
-        print(f"🔄 {AGENT_ROLES['triage']['name']}:")
-        triage_text = ""
-        async for chunk in self.query_agent_stream(
-            AGENT_ROLES["triage"],
-            f"Evaluate this query: '{user_query}'{context_info}"
-        ):
-            triage_text += chunk
+        triage_context = f"Evaluate this query: '{user_query}'{context_info}"
+        triage_key = self._stage_key("triage", triage_context, None)
+        triage_text = self.stage_cache.get(triage_key) or ""
+        local_triage = self._local_triage(user_query, context_info, log)
+        if local_triage is not None:
+            triage_text = local_triage
             yield {
                 "role": "triage",
-                "name": AGENT_ROLES["triage"]["name"],
-                "content": chunk
+                "name": self.roles["triage"].name,
+                "content": triage_text,
+                "local": True
             }
-        print("\n")
+        elif triage_text:
+            yield {
+                "role": "triage",
+                "name": self.roles["triage"].name,
+                "content": triage_text,
+                "reused": True
+            }
+        else:
+            agent_stream = self.query_agent_stream(
+                self.roles["triage"],
+                triage_context,
+                usage=query_usage
+            )
+            triage_timeout = self._triage_timeout(deadline)
+            triage_expires = None if triage_timeout is None else time.monotonic() + triage_timeout
+            try:
+                while True:
+                    chunk = await self._next_chunk(agent_stream, triage_expires)
+                    if chunk is None:
+                        break
+                    triage_text += chunk
+                    yield {
+                        "role": "triage",
+                        "name": self.roles["triage"].name,
+                        "content": chunk
+                    }
+            except asyncio.TimeoutError:
+                triage_text = self._triage_timed_out(deadline, log)
+            else:
+                self.stage_cache.put(triage_key, triage_text)
+                self._log_triage(user_query, triage_text, [])
+            finally:
+                # Close the provider stream right away if our consumer went away
+                await agent_stream.aclose()
+        log.body("triage", triage_text)
 
         # If simple query, stream direct response
         if triage_text.startswith("SIMPLE:"):
@@ -348,154 +748,119 @@ class AgentSwarm:
             }
             return
 
-        # For complex queries, proceed with full swarm analysis
-        print("⚡ Activating full agent swarm for complex query...\n")
-
-        # Step 1: Interpretation
-        print(f"🔍 {AGENT_ROLES['interpreter']['name']}:")
-        interpreter_text = ""
-        async for chunk in self.query_agent_stream(
-            AGENT_ROLES["interpreter"],
-            f"Analyze this query considering the conversation context:\n{context_info}\nQuery: '{user_query}'",
-            parameters
-        ):
-            interpreter_text += chunk
-            yield {
-                "role": "interpreter",
-                "name": AGENT_ROLES["interpreter"]["name"],
-                "content": chunk
-            }
-        print("\n")
-
-        # Step 2: Research
-        print(f"📚 {AGENT_ROLES['researcher']['name']}:")
-        researcher_text = ""
-        async for chunk in self.query_agent_stream(
-            AGENT_ROLES["researcher"],
-            f"Based on this interpretation:\n{interpreter_text}\nWhat specific aspects need investigation?",
-            parameters
-        ):
-            researcher_text += chunk
-            yield {
-                "role": "researcher",
-                "name": AGENT_ROLES["researcher"]["name"],
-                "content": chunk
-            }
-        print("\n")
-
-        # Step 3: Critical Analysis
-        print(f"⚖️ {AGENT_ROLES['critic']['name']}:")
-        critic_text = ""
-        async for chunk in self.query_agent_stream(
-            AGENT_ROLES["critic"],
-            f"Critically analyze these research points:\n{researcher_text}",
-            parameters
-        ):
-            critic_text += chunk
-            yield {
-                "role": "critic",
-                "name": AGENT_ROLES["critic"]["name"],
-                "content": chunk
-            }
-        print("\n")
-
-        # Step 4: Creative Exploration
-        print(f"💡 {AGENT_ROLES['creative']['name']}:")
-        creative_text = ""
-        async for chunk in self.query_agent_stream(
-            AGENT_ROLES["creative"],
-            f"Given this analysis:\n{critic_text}\nExplore creative perspectives and alternatives.",
-            parameters
-        ):
-            creative_text += chunk
-            yield {
-                "role": "creative",
-                "name": AGENT_ROLES["creative"]["name"],
-                "content": chunk
-            }
-        print("\n")
-
-        # Step 5: Final Synthesis
-        synthesis_context = f"""
-        Original Query: {user_query}
-        
-        Interpretation: {interpreter_text}
-        
-        Research Points: {researcher_text}
-        
-        Critical Analysis: {critic_text}
-        
-        Creative Perspectives: {creative_text}
-        
-        Please synthesize all this information into a comprehensive response.
-        """
-        
-        print(f"🎯 {AGENT_ROLES['synthesizer']['name']} - Final Response:")
-        final_response = ""
-        async for chunk in self.query_agent_stream(
-            AGENT_ROLES["synthesizer"],
-            synthesis_context,
-            parameters
-        ):
-            final_response += chunk
+        # For complex queries, run the stages selected by the complexity tier
+        tier = self._complexity_tier(triage_text)
+        log.info("Running tier %d pipeline", tier)
+
+        outputs = {}
+        for role_key in self._pipeline(tier):
+            # Send a stored output at once when nothing this stage depends on changed
+            stage_input = self._stage_input(role_key, user_query, context_info, outputs)
+            cached = self.stage_cache.get(self._stage_key(role_key, stage_input, parameters))
+            if cached is not None:
+                log.info("Reused %s", role_key)
+                outputs[role_key] = cached
+                yield {
+                    "role": role_key,
+                    "name": self.roles[role_key].name,
+                    "content": cached,
+                    "reused": True
+                }
+                continue
+
+            plan = self._plan_stage(role_key, deadline, log)
+            if plan is None:
+                continue
+            scale, timeout = plan
+
+            text = ""
+            started = time.monotonic()
+            if self._use_fan_out(role_key, outputs):
+                agent_stream = self._fan_out_stream(outputs["researcher"], parameters, query_usage, scale)
+            else:
+                agent_stream = self.query_agent_stream(
+                    self.roles[role_key],
+                    stage_input,
+                    parameters,
+                    usage=query_usage,
+                    max_tokens_scale=scale
+                )
+            expires = None if timeout is None else started + timeout
+            try:
+                while True:
+                    chunk = await self._next_chunk(agent_stream, expires)
+                    if chunk is None:
+                        break
+                    text += chunk
+                    yield {
+                        "role": role_key,
+                        "name": self.roles[role_key].name,
+                        "content": chunk
+                    }
+            except asyncio.TimeoutError:
+                # Already streamed text is kept, the stage is just cut short
+                if not text:
+                    deadline.skip(role_key)
+                elif role_key not in deadline.shortened:
+                    deadline.shortened.append(role_key)
+                log.warning("%s ran out of time after %d chars", role_key, len(text))
+            else:
+                self._observe_latency(role_key, time.monotonic() - started, scale)
+                self.stage_cache.put(self._stage_key(role_key, stage_input, parameters, scale), text)
+            finally:
+                await agent_stream.aclose()
+            if text:
+                outputs[role_key] = text
+            log.body(role_key, text)
+
+        # Without a synthesis in time, the latest stage output is the answer
+        final_response = self._final_answer(outputs, deadline)
+        if final_response and not outputs.get("synthesizer"):
             yield {
                 "role": "synthesizer",
-                "name": AGENT_ROLES["synthesizer"]["name"],
-                "content": chunk
+                "name": self.roles["synthesizer"].name,
+                "content": final_response
             }
-        print("\n")
+
+        # Let clients know the answer was degraded to meet the deadline
+        if deadline.summary()["degraded"]:
+            yield dict(
+                {"role": "status", "name": "Deadline", "content": ""},
+                **deadline.summary()
+            )
 
         # Store the final response if memory is enabled
         if self.memory:
             self.memory.add_exchange(user_id, user_query, final_response)
 
-    async def query_agent_stream(self, role: Dict, context: str, parameters: Optional[Dict] = None) -> AsyncGenerator[str, None]:
+    async def query_agent_stream(self, role: CompiledRole, context: str, parameters: Optional[Dict] = None, usage: Optional[Dict] = None, max_tokens_scale: float = 1.0) -> AsyncGenerator[str, None]:
         """Query a single agent with streaming"""
+        stream = None
+        text = []
+        reported = None
         try:
-            # Get role parameters
-            role_params = {}
-            if parameters and role["name"].lower().replace(" ", "_") in parameters:
-                role_params = parameters[role["name"].lower().replace(" ", "_")]
-            
-            # Modify system prompt based on parameters
-            system_prompt = role["system"]
-            if role_params:
-                param_context = "\nParameters:\n"
-                for param, value in role_params.items():
-                    param_context += f"- {param}: {value}%\n"
-                system_prompt = f"{system_prompt}\n{param_context}"
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": context
-                }
-            ]
-            
-            params = {
-                "messages": messages,
-                "model": self.model,
-                "stream": True
-            }
-            
-            if self.provider == "openai":
-                params["temperature"] = 0.7
-            elif self.provider == "heurist":
-                params["temperature"] = 0.7
-                params["max_tokens"] = 64
-            
-            stream = await self.client.chat.completions.create(**params)
-            
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            params = self._build_request(role, context, parameters, stream=True, max_tokens_scale=max_tokens_scale)
+
+            # The slot is held for the whole stream and released before any fallback call
+            async with self._slot(usage):
+                stream = await self.client.chat.completions.create(**params)
+
+                async for chunk in stream:
+                    # The usage chunk arrives last and carries no choices
+                    reported = self._extract_usage(chunk) or reported
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        text.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
 
         except Exception as e:
-            print(f"Streaming error: {str(e)}")
+            query_logger(usage).warning("Streaming error, falling back to a regular call: %s", e)
             # Fallback to non-streaming if streaming fails
-            response = await self.query_agent(role, context, parameters)
-            yield response 
\ No newline at end of file
+            response = await self.query_agent(role, context, parameters, usage, max_tokens_scale)
+            yield response
+        finally:
+            # Streams closed early by a disconnect or the deadline are billed for what was received
+            if stream is not None:
+                self._record_usage(role, params, "".join(text), reported, usage)
+            # Closing the response stops the provider from generating for nobody
+            if stream is not None and hasattr(stream, "close"):
+                await stream.close() 
\ No newline at end of file
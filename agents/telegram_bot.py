@@ -1,18 +1,24 @@
 import asyncio
+from typing import Optional
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from config.settings import TELEGRAM_BOT_TOKEN, USE_MEMORY
 from agents.swarm import AgentSwarm
 
 class TelegramBot:
-    def __init__(self):
-        self.swarm = AgentSwarm()
-        self.app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    def __init__(self, swarm: Optional[AgentSwarm] = None):
+        # Frontends running on the same loop pass in one swarm so they share its scheduler
+        self.swarm = swarm or AgentSwarm()
+        self.app = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(self.post_init).build()
         
         # Add handlers
         self.app.add_handler(CommandHandler("start", self.start_command))
         self.app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
 
+    async def post_init(self, application: Application):
+        """Warm up provider connections once the bot's event loop is running"""
+        await self.swarm.warm_up()
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Send a message when the command /start is issued."""
         await update.message.reply_text(
@@ -31,7 +37,8 @@ class TelegramBot:
             response = await self.swarm.process_query(
                 update.message.text, 
                 telegram_mode=True,
-                user_id=str(update.effective_user.id)
+                user_id=str(update.effective_user.id),
+                frontend="telegram"
             )
             
             if response:
@@ -55,4 +62,19 @@ class TelegramBot:
         # Start the memory cleanup task if memory is enabled
         if USE_MEMORY:
             self.swarm.memory.start_cleanup()
-        self.app.run_polling() 
\ No newline at end of file
+        self.app.run_polling()
+
+    async def serve(self):
+        """Run the bot on the running event loop, next to other frontends"""
+        print("Starting Telegram bot...")
+        if USE_MEMORY:
+            self.swarm.memory.start_cleanup()
+        async with self.app:
+            await self.post_init(self.app)
+            await self.app.start()
+            await self.app.updater.start_polling()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await self.app.updater.stop()
+                await self.app.stop() 
\ No newline at end of file
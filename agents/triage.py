@@ -0,0 +1,195 @@
+from typing import Dict, List, Optional, Tuple
+import atexit
+import json
+import math
+import os
+import queue
+import random
+import re
+import threading
+import time
+import zlib
+
+# Labels are the LLM triage decisions: SIMPLE or the complexity tier
+SIMPLE = "SIMPLE"
+GREETING = re.compile(r"^\s*(hi|hello|hey|thanks|thank you|good (morning|afternoon|evening)|bye|goodbye)\b[\s!.?]*$", re.I)
+COMPLEX_HINTS = re.compile(r"\b(compare|comparison|versus|vs\.?|pros and cons|trade-?offs?|strategy|strategies|plan|analy[sz]e|evaluate)\b", re.I)
+
+def triage_label(triage_response: str, tier: int) -> str:
+    """Turn an LLM triage response into a training label"""
+    return SIMPLE if triage_response.startswith("SIMPLE:") else str(tier)
+
+def hash_features(text: str, dims: int) -> Dict[int, float]:
+    """Hashed word, bigram and shape features of a query"""
+    words = re.findall(r"\w+", text.lower())
+    tokens = [f"w:{w}" for w in words]
+    tokens += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    tokens.append(f"len:{min(len(words) // 5, 8)}")
+    tokens.append(f"q:{min(text.count('?'), 3)}")
+    tokens.append("bias")
+
+    features: Dict[int, float] = {}
+    for token in tokens:
+        index = zlib.crc32(token.encode("utf-8")) % dims
+        features[index] = features.get(index, 0.0) + 1.0
+    # Normalize so long queries don't dominate the dot products
+    norm = math.sqrt(sum(v * v for v in features.values()))
+    return {i: v / norm for i, v in features.items()}
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    """Read (query, label) pairs from a triage decision log"""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                examples.append((entry["query"], str(entry["label"])))
+    return examples
+
+class TriageLog:
+    def __init__(self, path: str):
+        # Decisions are appended by a writer thread so the event loop never waits on the file
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, query: str, label: str):
+        """Queue an LLM triage decision for later training"""
+        self._queue.put(json.dumps({"query": query, "label": label}) + "\n")
+
+    def _write_loop(self):
+        while True:
+            lines = [self._queue.get()]
+            # Drain everything waiting so a burst of decisions costs one write
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            entries = [line for line in lines if line is not None]
+            if entries:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(entries))
+            if len(entries) < len(lines):
+                return
+
+    def close(self):
+        """Write out queued decisions and stop the writer"""
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+class TriageClassifier:
+    def __init__(self, labels: List[str] = None, dims: int = 2 ** 14, weights: Dict[str, Dict[int, float]] = None):
+        # Multinomial logistic regression over hashed features, weights stored sparse
+        self.labels = labels or [SIMPLE, "1", "2", "3"]
+        self.dims = dims
+        self.weights = weights or {label: {} for label in self.labels}
+
+    @staticmethod
+    def rule(query: str) -> Optional[str]:
+        """Labels that are clear without a model"""
+        # SIMPLE labels only count in evaluation, simple queries always go to the LLM for their answer
+        words = len(query.split())
+        if GREETING.match(query) or words <= 2:
+            return SIMPLE
+        if COMPLEX_HINTS.search(query) and words >= 8:
+            return "3"
+        return None
+
+    def probabilities(self, query: str) -> Dict[str, float]:
+        features = hash_features(query, self.dims)
+        scores = {
+            label: sum(self.weights[label].get(i, 0.0) * v for i, v in features.items())
+            for label in self.labels
+        }
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exp.values())
+        return {label: value / total for label, value in exp.items()}
+
+    def predict(self, query: str) -> Tuple[str, float]:
+        """Get the most likely label and its confidence, rules take precedence"""
+        # An untrained model predicts every label equally, so only the rules are confident
+        label = self.rule(query)
+        if label is not None:
+            return label, 1.0
+        probabilities = self.probabilities(query)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    def train(self, examples: List[Tuple[str, str]], epochs: int = 10, learning_rate: float = 0.5, l2: float = 1e-4):
+        """Fit the weights with stochastic gradient descent"""
+        for label in {label for _, label in examples} - set(self.labels):
+            self.labels.append(label)
+            self.weights[label] = {}
+        featurized = [(hash_features(query, self.dims), label) for query, label in examples]
+        rng = random.Random(0)
+        for epoch in range(epochs):
+            rng.shuffle(featurized)
+            rate = learning_rate / (1 + epoch)
+            for features, target in featurized:
+                scores = {
+                    label: sum(self.weights[label].get(i, 0.0) * v for i, v in features.items())
+                    for label in self.labels
+                }
+                top = max(scores.values())
+                exp = {label: math.exp(score - top) for label, score in scores.items()}
+                total = sum(exp.values())
+                for label in self.labels:
+                    gradient = exp[label] / total - (1.0 if label == target else 0.0)
+                    weights = self.weights[label]
+                    for i, v in features.items():
+                        weights[i] = weights.get(i, 0.0) * (1 - rate * l2) - rate * gradient * v
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "labels": self.labels,
+                "dims": self.dims,
+                "weights": {
+                    label: {str(i): round(w, 6) for i, w in weights.items() if abs(w) > 1e-6}
+                    for label, weights in self.weights.items()
+                }
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["TriageClassifier"]:
+        """Load a trained model, or None when there is none yet"""
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        weights = {
+            label: {int(i): w for i, w in values.items()}
+            for label, values in data["weights"].items()
+        }
+        return cls(data["labels"], data["dims"], weights)
+
+def evaluate(classifier: TriageClassifier, examples: List[Tuple[str, str]], threshold: float) -> Dict:
+    """Measure accuracy, local routing coverage and classification latency"""
+    correct = routed = routed_correct = simple_routed = 0
+    latencies = []
+    for query, label in examples:
+        started = time.perf_counter()
+        predicted, confidence = classifier.predict(query)
+        latencies.append(time.perf_counter() - started)
+        correct += predicted == label
+        # Only confident complex predictions skip the LLM triage
+        if predicted != SIMPLE and confidence >= threshold:
+            routed += 1
+            routed_correct += predicted == label
+            simple_routed += label == SIMPLE
+
+    latencies.sort()
+    total = len(examples)
+    return {
+        "examples": total,
+        "accuracy": round(correct / total, 3) if total else 0.0,
+        "local_coverage": round(routed / total, 3) if total else 0.0,
+        "routed_accuracy": round(routed_correct / routed, 3) if routed else 0.0,
+        "simple_sent_to_swarm": simple_routed,
+        "mean_latency_us": round(sum(latencies) / total * 1e6, 1) if total else 0.0,
+        "p99_latency_us": round(latencies[int(0.99 * (total - 1))] * 1e6, 1) if total else 0.0
+    }
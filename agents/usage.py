@@ -0,0 +1,102 @@
+from typing import Dict, Optional
+from datetime import datetime, timedelta
+from collections import deque
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a user has spent their token budget for the current window"""
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for providers that don't report usage"""
+    return max(1, len(text) // 4) if text else 0
+
+def max_tokens_for_role(defaults: Dict, role_params: Dict, base: int, minimum: int) -> int:
+    """Derive a completion cap for a role from its base limit and parameters"""
+    # Parameter overrides take precedence over the role defaults
+    values = dict(defaults)
+    values.update(role_params or {})
+
+    if "conciseness" in values:
+        # 0% concise -> 1.5x the base limit, 100% concise -> 0.5x
+        factor = 1.5 - values["conciseness"] / 100
+    else:
+        depth = [v for k, v in values.items() if any(w in k for w in ("depth", "breadth", "rigor"))]
+        factor = 0.5 + (sum(depth) / len(depth)) / 100 if depth else 1.0
+
+    return max(minimum, int(base * factor))
+
+class UsageTracker:
+    def __init__(self, user_budget: int = 0, window_hours: int = 24):
+        # Totals per role, per user and a sliding window for budget checks
+        self._by_role: Dict[str, Dict[str, int]] = {}
+        self._by_user: Dict[str, Dict[str, int]] = {}
+        self._by_frontend: Dict[str, Dict[str, int]] = {}
+        self._windows: Dict[str, deque] = {}
+        self.user_budget = user_budget
+        self.window = timedelta(hours=window_hours)
+
+    @staticmethod
+    def _empty() -> Dict[str, int]:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "calls": 0}
+
+    @staticmethod
+    def _add(totals: Dict[str, int], prompt_tokens: int, completion_tokens: int):
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["total_tokens"] += prompt_tokens + completion_tokens
+        totals["calls"] += 1
+
+    def start_query(self, user_id: str, frontend: str = "default") -> Dict:
+        """Create the usage record for a single query"""
+        query_usage = {"user_id": user_id, "frontend": frontend, "roles": {}}
+        query_usage.update(self._empty())
+        return query_usage
+
+    def record(self, query_usage: Optional[Dict], role_key: str, prompt_tokens: int, completion_tokens: int):
+        """Record token usage of one agent call"""
+        user_id = query_usage["user_id"] if query_usage else "default"
+        frontend = query_usage["frontend"] if query_usage else "default"
+
+        self._add(self._by_role.setdefault(role_key, self._empty()), prompt_tokens, completion_tokens)
+        self._add(self._by_user.setdefault(user_id, self._empty()), prompt_tokens, completion_tokens)
+        self._add(self._by_frontend.setdefault(frontend, self._empty()), prompt_tokens, completion_tokens)
+        self._windows.setdefault(user_id, deque()).append(
+            (datetime.now(), prompt_tokens + completion_tokens)
+        )
+
+        if query_usage is not None:
+            self._add(query_usage, prompt_tokens, completion_tokens)
+            self._add(query_usage["roles"].setdefault(role_key, self._empty()), prompt_tokens, completion_tokens)
+
+    def user_tokens(self, user_id: str) -> int:
+        """Tokens spent by a user within the budget window"""
+        window = self._windows.get(user_id)
+        if not window:
+            return 0
+        cutoff = datetime.now() - self.window
+        while window and window[0][0] < cutoff:
+            window.popleft()
+        return sum(tokens for _, tokens in window)
+
+    def remaining_budget(self, user_id: str) -> Optional[int]:
+        """Tokens left for a user, or None when budgets are disabled"""
+        if not self.user_budget:
+            return None
+        return max(0, self.user_budget - self.user_tokens(user_id))
+
+    def check_budget(self, user_id: str):
+        """Raise if the user has no budget left"""
+        if self.remaining_budget(user_id) == 0:
+            raise TokenBudgetExceeded(
+                f"Token budget of {self.user_budget} exceeded for user '{user_id}', please try again later"
+            )
+
+    def summary(self, user_id: Optional[str] = None) -> Dict:
+        """Get aggregated usage, optionally for a single user"""
+        if user_id is not None:
+            return {
+                "user_id": user_id,
+                "usage": self._by_user.get(user_id, self._empty()),
+                "window_tokens": self.user_tokens(user_id),
+                "remaining_budget": self.remaining_budget(user_id)
+            }
+        return {"roles": self._by_role, "users": self._by_user, "frontends": self._by_frontend}
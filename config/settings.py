@@ -10,6 +10,9 @@ HEURIST_API_KEY = ""
 HEURIST_MODEL = "mistralai/mixtral-8x7b-instruct"  # Example Heurist model
 HEURIST_BASE_URL = "https://llm-gateway.heurist.xyz"
 
+# Roles configuration
+ROLES_FILE = ""  # Optional JSON/YAML roles file (see https://quarm.io/generator.html), empty uses agents/roles.py
+
 # Memory configuration
 USE_MEMORY = False  # Set to False to disable conversation memory
 MAX_MEMORY_ITEMS = 3  # Number of previous exchanges to remember
@@ -24,10 +27,85 @@ API_HOST = "127.0.0.1"  # Use "0.0.0.0" to allow external connections
 API_PORT = 8000
 SEND_FULL_SWARM_RESPONSE = True  # Set to True to send all agent responses via API
 USE_STREAMING = True  # Set to True to enable streaming responses
+DISCONNECT_POLL_INTERVAL = 0.5  # Seconds between checks for closed streaming clients
+
+# Provider connection configuration
+HTTP_MAX_CONNECTIONS = 100  # Max open connections to the provider
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20  # Idle connections kept open for reuse
+HTTP_KEEPALIVE_EXPIRY = 60  # Seconds an idle connection is kept open
+HTTP2_ENABLED = False  # Requires: pip install httpx[http2]
+HTTP_TIMEOUT = 60  # seconds
+WARMUP_CONNECTIONS = 2  # Connections pre-established at startup
+WARMUP_TIMEOUT = 5  # Seconds warm-up may delay startup, a single attempt without retries
+KEEP_WARM_INTERVAL = 45  # Seconds between keep-warm pings while idle, 0 disables
+
+# Deadline configuration
+DEFAULT_LATENCY_BUDGET = 0  # Seconds per query when the request sets none, 0 disables deadlines
+OPTIONAL_STAGES = ["critic", "creative"]  # Stages skipped first when time runs short
+DEGRADE_MIN_SCALE = 0.25  # Stages that would be cut below this fraction of their length are skipped
+STAGE_LATENCY_ESTIMATE = 5.0  # Assumed seconds per stage until real latencies are measured
+
+# Research fan-out configuration
+RESEARCH_FAN_OUT = False  # Analyze the researcher's sub-questions in parallel instead of one critic call
+FAN_OUT_WIDTH = 4  # Max sub-question analyses running at once
+FAN_OUT_MAX_QUESTIONS = 6  # Sub-questions analyzed per query, the rest are dropped
+FAN_OUT_TOKEN_SCALE = 0.4  # Share of the critic's max_tokens given to each sub-question
+
+# Scheduling configuration
+SCHEDULER_MAX_CONCURRENCY = 16  # Agent calls in flight across all users, 0 disables scheduling
+SCHEDULER_USER_CONCURRENCY = 4  # Agent calls in flight per user
+FRONTEND_WEIGHTS = {  # Share of provider capacity per frontend when they compete
+    "telegram": 8,
+    "cli": 8,
+    "api": 4,
+    "default": 2,
+    "batch": 1
+}
+
+# Stage cache configuration
+STAGE_CACHE_SIZE = 512  # Stage outputs memoized by a hash of their inputs, 0 disables reuse
+STAGE_CACHE_TTL_SECONDS = 3600  # How long a stored stage output can be reused
+
+# Local triage configuration
+LOCAL_TRIAGE = False  # Skip the triage LLM call when the local classifier is confident a query is complex
+LOCAL_TRIAGE_THRESHOLD = 0.85  # Minimum classifier confidence to route locally
+TRIAGE_MODEL_FILE = "triage_model.json"  # Trained with: python main.py train-triage <log>
+TRIAGE_LOG_FILE = ""  # Append LLM triage decisions here as training data, empty disables logging
+
+# Logging configuration
+LOG_LEVEL = "INFO"  # DEBUG also logs every query and response body
+LOG_FORMAT = "text"  # "text" or "json"
+LOG_SAMPLE_RATE = 0.01  # Fraction of queries whose full bodies are logged at INFO
+LOG_MAX_BODY_CHARS = 2000  # Bodies are truncated to this length in logs
+LOG_QUEUE_SIZE = 10000  # Records waiting for the log writer thread, extra ones are dropped
+
+# Batch configuration
+BATCH_CONCURRENCY = 8  # Queries run in parallel by the batch command
 
 # Swarm configuration
 MAX_RETRIES = 3
 RETRY_DELAY = 1  # seconds
 
+# Token configuration
+ROLE_MAX_TOKENS = {  # Base completion cap per role, scaled by role parameters
+    "triage": 256,
+    "interpreter": 300,
+    "researcher": 400,
+    "critic": 400,
+    "creative": 400,
+    "synthesizer": 300
+}
+MIN_MAX_TOKENS = 32  # Lower bound for any derived completion cap
+USER_TOKEN_BUDGET = 0  # Max tokens per user within the budget window, 0 disables budgets
+TOKEN_BUDGET_WINDOW_HOURS = 24  # Length of the per-user budget window
+
+# Pipeline depth per triage complexity tier, stages always run in swarm order
+COMPLEXITY_TIERS = {
+    1: ["synthesizer"],
+    2: ["interpreter", "synthesizer"],
+    3: ["interpreter", "researcher", "critic", "creative", "synthesizer"]
+}
+DEFAULT_COMPLEXITY_TIER = 3  # Used when triage doesn't report a valid tier
+
 # SSL configuration
 SSL_ENABLED = False  # SSL will be handled by Nginx instead 
\ No newline at end of file
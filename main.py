@@ -1,34 +1,73 @@
+import argparse
 import asyncio
+import os
+import statistics
+import subprocess
+import sys
 import threading
-from agents.swarm import AgentSwarm
-from agents.telegram_bot import TelegramBot
-from agents.api_server import APIServer
 from config.settings import (
     TELEGRAM_BOT_TOKEN,
+    OPENAI_API_KEY,
+    GROQ_API_KEY,
     USE_MEMORY,
     USE_API,
     API_HOST,
-    API_PORT
+    API_PORT,
+    BATCH_CONCURRENCY,
+    TRIAGE_MODEL_FILE,
+    LOCAL_TRIAGE_THRESHOLD
 )
 
-async def cli_mode():
+# SDK of the configured provider, imported lazily when the swarm starts (OpenAI and Heurist share one)
+PROVIDER_MODULE = "groq" if GROQ_API_KEY and not OPENAI_API_KEY else "openai"
+
+# Modules each mode needs, frontends are only imported when their mode runs
+MODE_MODULES = {
+    "cli": ["agents.swarm", PROVIDER_MODULE],
+    "telegram": ["agents.telegram_bot", PROVIDER_MODULE],
+    "api": ["agents.api_server", PROVIDER_MODULE],
+    "batch": ["agents.batch", PROVIDER_MODULE]
+}
+
+async def read_line(prompt: str) -> str:
+    """Read a line from stdin without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    line = loop.create_future()
+
+    def read():
+        try:
+            result = input(prompt)
+        except Exception as e:
+            loop.call_soon_threadsafe(lambda: line.done() or line.set_exception(e))
+            return
+        loop.call_soon_threadsafe(lambda: line.done() or line.set_result(result))
+
+    # A daemon thread, so a pending read never holds up exiting
+    threading.Thread(target=read, daemon=True).start()
+    return await line
+
+async def cli_mode(swarm=None):
     """Run in CLI mode"""
-    swarm = AgentSwarm()
+    if swarm is None:
+        from agents.swarm import AgentSwarm
+        swarm = AgentSwarm()
     if USE_MEMORY:
         swarm.memory.start_cleanup()
-    
+    await swarm.warm_up()
+
     print("Welcome to the AI Agent Swarm!")
     print("Please enter your query (or 'quit' to exit):")
-    
+
     while True:
         try:
-            user_query = input("\n❓ Your query: ").strip()
+            user_query = (await read_line("\n❓ Your query: ")).strip()
             if user_query.lower() == 'quit':
                 break
             if not user_query:
                 continue
-                
-            await swarm.process_query(user_query)
+
+            response = await swarm.process_query(user_query, frontend="cli")
+            print(f"\n🎯 {response}")
             print("\n-----------------------------------")
         except Exception as e:
             print(f"\n❌ Error: {str(e)}")
@@ -36,25 +75,156 @@ async def cli_mode():
 
 def telegram_mode():
     """Run in Telegram mode"""
+    from agents.telegram_bot import TelegramBot
     print("🤖 Starting AI Agent Swarm in Telegram mode...")
     bot = TelegramBot()
     bot.run()
 
-def start_api_server():
-    """Start the API server in a separate thread"""
-    server = APIServer(host=API_HOST, port=API_PORT)
+def start_api_server(host: str = API_HOST, port: int = API_PORT):
+    """Start the API server"""
+    from agents.api_server import APIServer
+    server = APIServer(host=host, port=port)
     server.run()
 
-if __name__ == "__main__":
-    # Start API server if enabled
-    if USE_API:
-        print(f"🚀 Starting API server on {API_HOST}:{API_PORT}")
-        api_thread = threading.Thread(target=start_api_server, daemon=True)
-        api_thread.start()
-    
-    # Run main interface (CLI or Telegram)
+async def batch_mode(input_path: str, output_path: str, checkpoint_path: str, concurrency: int):
+    """Run a JSONL file of queries through the swarm"""
+    from agents.swarm import AgentSwarm
+    from agents.batch import BatchRunner
+    swarm = AgentSwarm()
+    # The batch has this swarm to itself, so --concurrency bounds it rather than the interactive per-user cap
+    swarm.scheduler.user_concurrency = max(swarm.scheduler.user_concurrency, concurrency)
+    await swarm.warm_up()
+    runner = BatchRunner(swarm, concurrency=concurrency)
+    await runner.run(input_path, output_path, checkpoint_path)
+
+def train_triage(log_path: str, model_path: str, epochs: int, holdout: float):
+    """Train the local triage classifier from logged LLM triage decisions"""
+    import random
+    from agents.triage import TriageClassifier, load_examples, evaluate
+    examples = load_examples(log_path)
+    random.Random(0).shuffle(examples)
+    split = int(len(examples) * (1 - holdout))
+    train, test = examples[:split], examples[split:]
+
+    classifier = TriageClassifier()
+    classifier.train(train, epochs=epochs)
+    classifier.save(model_path)
+    print(f"✅ Trained on {len(train)} decisions, saved to {model_path}")
+    if test:
+        print(f"📊 Held-out evaluation: {evaluate(classifier, test, LOCAL_TRIAGE_THRESHOLD)}")
+
+def eval_triage(log_path: str, model_path: str, threshold: float):
+    """Evaluate the local triage classifier against logged LLM triage decisions"""
+    from agents.triage import TriageClassifier, load_examples, evaluate
+    classifier = TriageClassifier.load(model_path)
+    if classifier is None:
+        print(f"❌ No triage model found at {model_path}")
+        return
+    for key, value in evaluate(classifier, load_examples(log_path), threshold).items():
+        print(f"  {key}: {value}")
+
+def import_benchmark(runs: int = 5):
+    """Measure cold import time of each mode in fresh interpreters"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    print(f"⏱️ Import time per mode (median of {runs} fresh interpreters):")
+    for mode, modules in MODE_MODULES.items():
+        code = (
+            "import time; t = time.perf_counter(); "
+            + "; ".join(f"import {module}" for module in modules)
+            + "; print(time.perf_counter() - t)"
+        )
+        timings = []
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"  {mode}: failed ({result.stderr.strip().splitlines()[-1]})")
+                break
+            timings.append(float(result.stdout.strip()) * 1000)
+        else:
+            print(f"  {mode}: {statistics.median(timings):.1f} ms")
+
+async def shared_mode():
+    """Run the API server next to Telegram or the CLI on one event loop and one swarm"""
+    from agents.swarm import AgentSwarm
+    from agents.api_server import APIServer
+    # A single swarm means a single scheduler, so FRONTEND_WEIGHTS decide between the frontends
+    swarm = AgentSwarm()
+    print(f"🚀 Starting API server on {API_HOST}:{API_PORT}")
+    frontends = [APIServer(host=API_HOST, port=API_PORT, swarm=swarm).serve()]
     if TELEGRAM_BOT_TOKEN:
+        from agents.telegram_bot import TelegramBot
+        print("🤖 Starting AI Agent Swarm in Telegram mode...")
+        frontends.append(TelegramBot(swarm).serve())
+    else:
+        print("ℹ️ No Telegram token found in settings.py, running in CLI mode...")
+        frontends.append(cli_mode(swarm))
+
+    # Stop everything once one frontend exits, e.g. the CLI on 'quit'
+    tasks = [asyncio.ensure_future(frontend) for frontend in frontends]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        task.result()
+
+def default_mode():
+    """Run the interface selected in settings.py"""
+    if USE_API:
+        asyncio.run(shared_mode())
+    elif TELEGRAM_BOT_TOKEN:
         telegram_mode()
     else:
         print("ℹ️ No Telegram token found in settings.py, running in CLI mode...")
-        asyncio.run(cli_mode())
\ No newline at end of file
+        asyncio.run(cli_mode())
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI Agent Swarm")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("cli", help="Interactive command line mode")
+    commands.add_parser("telegram", help="Run the Telegram bot")
+    api = commands.add_parser("api", help="Run the API server")
+    api.add_argument("--host", default=API_HOST)
+    api.add_argument("--port", type=int, default=API_PORT)
+    batch = commands.add_parser("batch", help="Run a JSONL file of queries")
+    batch.add_argument("input", help="JSONL file with one {\"id\", \"text\", \"user_id\", \"parameters\"} object per line")
+    batch.add_argument("output", help="JSONL file results are appended to")
+    batch.add_argument("--checkpoint", help="File of completed ids, defaults to <output>.checkpoint")
+    batch.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    train = commands.add_parser("train-triage", help="Train the local triage classifier from a triage log")
+    train.add_argument("log")
+    train.add_argument("--model", default=TRIAGE_MODEL_FILE)
+    train.add_argument("--epochs", type=int, default=10)
+    train.add_argument("--holdout", type=float, default=0.2, help="Share of decisions kept for evaluation")
+    evaluation = commands.add_parser("eval-triage", help="Evaluate the local triage classifier on a triage log")
+    evaluation.add_argument("log")
+    evaluation.add_argument("--model", default=TRIAGE_MODEL_FILE)
+    evaluation.add_argument("--threshold", type=float, default=LOCAL_TRIAGE_THRESHOLD)
+    bench = commands.add_parser("bench-imports", help="Measure import time of each mode")
+    bench.add_argument("--runs", type=int, default=5)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.command == "cli":
+        asyncio.run(cli_mode())
+    elif args.command == "telegram":
+        telegram_mode()
+    elif args.command == "api":
+        start_api_server(args.host, args.port)
+    elif args.command == "batch":
+        asyncio.run(batch_mode(
+            args.input,
+            args.output,
+            args.checkpoint or f"{args.output}.checkpoint",
+            args.concurrency
+        ))
+    elif args.command == "train-triage":
+        train_triage(args.log, args.model, args.epochs, args.holdout)
+    elif args.command == "eval-triage":
+        eval_triage(args.log, args.model, args.threshold)
+    elif args.command == "bench-imports":
+        import_benchmark(args.runs)
+    else:
+        default_mode()
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+import asyncio
+
+import pytest
+
+import agents.swarm as swarm_module
+from agents.swarm import AgentSwarm
+
+class FakeStream:
+    def __init__(self, text: str):
+        self.words = text.split(" ")
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for word in self.words:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))], usage=None)
+
+    async def close(self):
+        pass
+
+class FakeCompletions:
+    """Provider stand-in that answers each role with a fixed text after a per-role delay"""
+    def __init__(self, swarm: AgentSwarm):
+        self.swarm = swarm
+        self.calls = []
+        self.delays = {}
+        self.answers = {"triage": "COMPLEX: 3"}
+
+    def role(self, messages) -> str:
+        system = messages[0]["content"]
+        return next(key for key in self.swarm.roles if system.startswith(self.swarm.roles[key].system))
+
+    async def create(self, **params):
+        role = self.role(params["messages"])
+        self.calls.append(role)
+        await asyncio.sleep(self.delays.get(role, 0))
+        text = self.answers.get(role, f"{role} answer")
+        if params.get("stream"):
+            return FakeStream(text)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5)
+        )
+
+@pytest.fixture
+def make_swarm(monkeypatch):
+    """Build an AgentSwarm on a fake provider, overriding swarm settings by name"""
+    def make(**settings) -> AgentSwarm:
+        monkeypatch.setattr(swarm_module, "OPENAI_API_KEY", "test")
+        for name, value in settings.items():
+            monkeypatch.setattr(swarm_module, name, value)
+        swarm = AgentSwarm()
+        swarm.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(swarm)))
+        return swarm
+    return make
@@ -0,0 +1,30 @@
+import asyncio
+import json
+
+from agents.batch import BatchRunner
+
+def test_failures_are_kept_out_of_the_results_and_retried(make_swarm, tmp_path):
+    swarm = make_swarm(MAX_RETRIES=1)
+    completions = swarm.client.chat.completions
+    queries = tmp_path / "queries.jsonl"
+    queries.write_text("".join(json.dumps({"id": str(i), "text": f"question {i}"}) + "\n" for i in range(3)))
+    output = tmp_path / "results.jsonl"
+    checkpoint = tmp_path / "results.jsonl.checkpoint"
+
+    create = completions.create
+
+    async def fail_question_one(**params):
+        if "question 1" in params["messages"][1]["content"]:
+            raise RuntimeError("provider down")
+        return await create(**params)
+
+    completions.create = fail_question_one
+    asyncio.run(BatchRunner(swarm, concurrency=2).run(str(queries), str(output), str(checkpoint)))
+    completions.create = create
+    asyncio.run(BatchRunner(swarm, concurrency=2).run(str(queries), str(output), str(checkpoint)))
+
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    errors = [json.loads(line) for line in (tmp_path / "results.jsonl.errors").read_text().splitlines()]
+    assert sorted(result["id"] for result in results) == ["0", "1", "2"]
+    assert all("error" not in result for result in results)
+    assert [error["id"] for error in errors] == ["1"]
@@ -0,0 +1,60 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import threading
+import time
+
+from agents.connections import ConnectionPool
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+def test_create_client_sends_requests_and_counts_connections():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    pool = ConnectionPool()
+
+    async def run():
+        async with pool.create_client() as client:
+            for _ in range(3):
+                response = await client.get(url)
+                assert response.text == "ok"
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    stats = pool.stats()
+    assert stats["requests"] == 3
+    assert stats["new_connections"] == 1
+    assert stats["reuse_rate"] == 0.667
+
+class HangingModels:
+    async def list(self):
+        await asyncio.sleep(3600)
+
+class HangingClient:
+    def __init__(self):
+        self.options = None
+        self.models = HangingModels()
+
+    def with_options(self, **options):
+        self.options = options
+        return self
+
+def test_warm_up_gives_up_after_timeout():
+    client = HangingClient()
+    started = time.monotonic()
+    asyncio.run(ConnectionPool().warm_up(client, connections=2, timeout=0.2))
+    assert time.monotonic() - started < 1
+    assert client.options == {"max_retries": 0, "timeout": 0.2}
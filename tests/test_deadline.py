@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+
+from agents.deadline import Deadline, DeadlineExceeded
+
+def test_unbounded_runs_every_stage_in_full():
+    deadline = Deadline(None)
+    assert deadline.plan("researcher", 5.0, 5.0) == (1.0, None)
+    assert deadline.plan("synthesizer", 5.0) == (1.0, None)
+    assert deadline.triage_timeout(5.0) is None
+    assert not deadline.summary()["degraded"]
+
+def test_stage_that_fits_gets_the_time_before_the_reserve():
+    deadline = Deadline(10)
+    scale, timeout = deadline.plan("researcher", 2.0, 3.0)
+    assert scale == 1.0
+    assert 6.9 < timeout <= 7.0
+
+def test_optional_stage_is_skipped_and_required_stage_shortened():
+    deadline = Deadline(10, optional_stages=["critic"], min_scale=0.25)
+    assert deadline.plan("critic", 8.0, 4.0) is None
+    scale, timeout = deadline.plan("researcher", 8.0, 4.0)
+    assert 0.7 < scale <= 0.75
+    assert deadline.summary() == {"degraded": True, "skipped_stages": ["critic"], "shortened_stages": ["researcher"]}
+
+def test_stage_below_min_scale_is_skipped():
+    deadline = Deadline(10, min_scale=0.5)
+    assert deadline.plan("researcher", 20.0, 6.0) is None
+
+def test_synthesis_is_shortened_to_the_time_left_and_bounded_by_it():
+    deadline = Deadline(2, min_scale=0.25)
+    scale, timeout = deadline.plan("synthesizer", 4.0)
+    assert 0.49 < scale <= 0.5
+    assert 1.9 < timeout <= 2.0
+    assert deadline.shortened == ["synthesizer"]
+
+def test_synthesis_is_skipped_once_the_deadline_has_passed():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    assert deadline.plan("synthesizer", 4.0) is None
+    assert deadline.skipped == ["synthesizer"]
+
+def test_triage_leaves_time_for_synthesis():
+    deadline = Deadline(10)
+    assert 6.9 < deadline.triage_timeout(3.0) <= 7.0
+    # Between a quarter and half of the time left is held back
+    assert 4.9 < deadline.triage_timeout(30.0) <= 5.0
+    assert 7.4 < deadline.triage_timeout(0.1) <= 7.5
+
+def test_slow_triage_still_gets_an_answer_within_the_budget(make_swarm):
+    swarm = make_swarm()
+    swarm.client.chat.completions.delays["triage"] = 5
+
+    started = time.monotonic()
+    details = asyncio.run(swarm.process_query_with_details("explain relativity", latency_budget=0.4))
+    assert time.monotonic() - started < 0.5
+    assert details["synthesizer"]["response"] == "synthesizer answer"
+    assert details["skipped_stages"][0] == "triage"
+
+    events = []
+
+    async def stream():
+        async for event in swarm.process_query_streaming("explain gravity", latency_budget=0.4):
+            events.append(event)
+
+    asyncio.run(stream())
+    assert "".join(e["content"] for e in events if e["role"] == "synthesizer").strip() == "synthesizer answer"
+
+def test_no_answer_by_the_deadline_is_an_error(make_swarm):
+    swarm = make_swarm()
+    swarm.client.chat.completions.delays.update({"triage": 5, "synthesizer": 5})
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(swarm.process_query("explain relativity", latency_budget=0.2))
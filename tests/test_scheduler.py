@@ -0,0 +1,68 @@
+import asyncio
+
+from agents.scheduler import FairScheduler
+
+async def peak_concurrency(scheduler: FairScheduler, user_ids, frontend: str = "api") -> int:
+    running = 0
+    peak = 0
+
+    async def call(user_id: str):
+        nonlocal running, peak
+        async with scheduler.slot(user_id, frontend):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(call(user_id) for user_id in user_ids))
+    return peak
+
+def test_per_user_cap():
+    scheduler = FairScheduler(max_concurrency=8, user_concurrency=2)
+    assert asyncio.run(peak_concurrency(scheduler, ["alice"] * 6)) == 2
+    assert asyncio.run(peak_concurrency(scheduler, ["alice", "bob", "carol"] * 3)) == 6
+    assert scheduler.stats() == {"running": 0, "queued": 0, "users_running": 0}
+
+def test_anonymous_requests_are_not_capped_together():
+    scheduler = FairScheduler(max_concurrency=8, user_concurrency=2)
+    assert asyncio.run(peak_concurrency(scheduler, ["default"] * 10)) == 8
+
+def test_heavier_frontend_gets_more_turns():
+    scheduler = FairScheduler(max_concurrency=1, user_concurrency=1, weights={"telegram": 4, "batch": 1})
+    order = []
+
+    async def call(user_id: str, frontend: str):
+        async with scheduler.slot(user_id, frontend):
+            order.append(frontend)
+            await asyncio.sleep(0)
+
+    async def run():
+        # Hold the only slot so every call below queues
+        async with scheduler.slot("holder", "batch"):
+            tasks = [asyncio.ensure_future(call("b", "batch")) for _ in range(4)]
+            tasks += [asyncio.ensure_future(call("t", "telegram")) for _ in range(4)]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order[:4].count("telegram") >= 3
+
+def test_cancelled_waiters_release_nothing_and_leave_the_queue():
+    scheduler = FairScheduler(max_concurrency=1, user_concurrency=1)
+
+    async def wait_for_slot():
+        async with scheduler.slot("bob"):
+            pass
+
+    async def run():
+        async with scheduler.slot("alice"):
+            waiter = asyncio.ensure_future(wait_for_slot())
+            await asyncio.sleep(0)
+            assert scheduler.stats()["queued"] == 1
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        # The freed slot is usable again
+        assert await peak_concurrency(scheduler, ["carol"]) == 1
+
+    asyncio.run(run())
+    assert scheduler.stats() == {"running": 0, "queued": 0, "users_running": 0}
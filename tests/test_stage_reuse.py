@@ -0,0 +1,28 @@
+import asyncio
+
+def test_resubmit_with_memory_only_reruns_the_changed_stage(make_swarm):
+    swarm = make_swarm(USE_MEMORY=True)
+    calls = swarm.client.chat.completions.calls
+
+    async def run():
+        await swarm.process_query_with_details("compare tcp and udp", user_id="alice")
+        first_run = len(calls)
+        details = await swarm.process_query_with_details(
+            "compare tcp and udp",
+            user_id="alice",
+            parameters={"synthesizer": {"conciseness": 90}}
+        )
+        return first_run, details
+
+    first_run, details = asyncio.run(run())
+    assert calls[:first_run] == ["triage", "interpreter", "researcher", "critic", "creative", "synthesizer"]
+    assert calls[first_run:] == ["synthesizer"]
+    assert details["reused_stages"] == ["triage", "interpreter", "researcher", "critic", "creative"]
+    # The re-submit replaced the first answer instead of adding to the conversation
+    assert len(swarm.memory._conversations["alice"]) == 1
+
+def test_follow_up_queries_still_see_the_conversation(make_swarm):
+    swarm = make_swarm(USE_MEMORY=True)
+    asyncio.run(swarm.process_query("compare tcp and udp", user_id="alice"))
+    assert "compare tcp and udp" in swarm.memory.get_context("alice", exclude_query="and which is faster?")
+    assert swarm.memory.get_context("alice", exclude_query="compare tcp and udp") == ""
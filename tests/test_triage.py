@@ -0,0 +1,23 @@
+import asyncio
+
+from agents.triage import SIMPLE, TriageClassifier
+
+def test_untrained_classifier_only_trusts_rules():
+    classifier = TriageClassifier()
+    assert classifier.predict("compare the pros and cons of postgres and mysql for analytics") == ("3", 1.0)
+    assert classifier.predict("hello") == (SIMPLE, 1.0)
+    label, confidence = classifier.predict("tell me about the history of the roman empire")
+    assert confidence < 0.5
+
+def test_rules_route_locally_without_a_model_file(make_swarm, tmp_path):
+    swarm = make_swarm(LOCAL_TRIAGE=True, TRIAGE_MODEL_FILE=str(tmp_path / "missing.json"))
+    calls = swarm.client.chat.completions.calls
+
+    details = asyncio.run(swarm.process_query_with_details("compare the pros and cons of postgres and mysql for analytics"))
+    assert details["triage"]["local"]
+    assert "triage" not in calls
+
+    # Simple queries still need the LLM, its triage reply is the answer
+    swarm.client.chat.completions.answers["triage"] = "SIMPLE: Hi there"
+    assert asyncio.run(swarm.process_query("hello")) == "Hi there"
+    assert calls.count("triage") == 1